@@ -30,14 +30,203 @@ from ..connector import DBConnector
 from ..plugin import ConnectionError, DbError, Table
 
 import os
+import re
+import time
+import threading
+import Queue
 import cx_Oracle
 from qgis.core import QGis, QgsApplication, QgsMessageLog
 import sqlite3
+import decimal
+from collections import OrderedDict
 
 def classFactory():
 	return OracleDBConnector
 
+class OracleSessionPoolExhausted(Exception):
+	""" no session of the pool has been freed in time """
+
+	def __init__(self, maxSessions):
+		Exception.__init__(self, u"All the %d sessions of the pool are busy (see poolMaxSessions and poolWaitTimeout)" % maxSessions)
+
+
+class OracleSessionPool(object):
+	""" process-wide cx_Oracle.SessionPool, one per connection name.
+		Connectors borrow sessions from it and hand them back, so
+		reconnects and worker threads don't pay for a full logon.
+	"""
+
+	_pools = {}
+	_lock = threading.Lock()
+
+	@classmethod
+	def instance(cls, connName, user, passwd, dsn, minSessions=1, maxSessions=4, increment=1):
+		""" returns the pool registered for this connection, creating it if needed """
+		key = (connName, user, dsn)
+		with cls._lock:
+			pool = cls._pools.get(key)
+			if pool is not None and pool.passwd != passwd:
+				# credentials have changed (QgsCredentials retry): start over
+				del cls._pools[key]
+				pool.close()
+				pool = None
+
+			if pool is None:
+				pool = cls(user, passwd, dsn, minSessions, maxSessions, increment)
+				cls._pools[key] = pool
+
+		return pool
+
+	def __init__(self, user, passwd, dsn, minSessions, maxSessions, increment):
+		self.passwd = passwd
+		# no waiting in the OCI, which can't be bounded nor interrupted
+		# before cx_Oracle 6.4: see acquire
+		self.pool = cx_Oracle.SessionPool(user, passwd, dsn, minSessions, max(minSessions, maxSessions), increment, threaded=True, getmode=cx_Oracle.SPOOL_ATTRVAL_NOWAIT)
+
+		# acquisition statistics
+		self._statsLock = threading.Lock()
+		self.acquired = 0
+		self.waitTime = 0.0
+		self.maxWaitTime = 0.0
+
+	def acquire(self, timeout=0, cancelled=None):
+		""" borrow a session. If all of them are busy, wait for one up to
+			timeout seconds, or until the cancelled Event is set, then raise
+			OracleSessionPoolExhausted """
+		start = time.time()
+		while True:
+			try:
+				conn = self.pool.acquire()
+				break
+			except cx_Oracle.DatabaseError:
+				if self.pool.busy < self.pool.max:
+					# not a matter of free sessions (e.g. logon refused)
+					raise
+				if time.time() - start >= timeout or (cancelled is not None and cancelled.is_set()):
+					raise OracleSessionPoolExhausted(self.pool.max)
+				time.sleep(0.05)
+		wait = time.time() - start
+
+		with self._statsLock:
+			self.acquired += 1
+			self.waitTime += wait
+			self.maxWaitTime = max(self.maxWaitTime, wait)
+
+		return conn
+
+	def release(self, conn):
+		""" hand a session back, discarding any uncommitted work """
+		try:
+			conn.rollback()
+			self.pool.release(conn)
+		except cx_Oracle.Error:
+			# dead session: let the pool forget about it
+			try:
+				self.pool.drop(conn)
+			except cx_Oracle.Error:
+				pass
+
+	def close(self):
+		try:
+			self.pool.close()
+		except (AttributeError, cx_Oracle.Error):
+			# busy sessions or old cx_Oracle: the pool goes away with its last session
+			pass
+
+	def statistics(self):
+		""" returns a dict with the pool usage: busy, opened, min, max, increment,
+			acquired, waitTime (total seconds) and maxWaitTime (seconds) """
+		with self._statsLock:
+			return { 'busy': self.pool.busy,
+				 'opened': self.pool.opened,
+				 'min': self.pool.min,
+				 'max': self.pool.max,
+				 'increment': self.pool.increment,
+				 'acquired': self.acquired,
+				 'waitTime': self.waitTime,
+				 'maxWaitTime': self.maxWaitTime }
+
+
+class OracleGeomTypesCache(object):
+	""" persistent cache of the geometry types found by probing the spatial
+		tables, stored in a SQLite file of the QGIS settings directory.
+		Entries are keyed by (connection, owner, table, column) and stamped
+		with the LAST_DDL_TIME and NUM_ROWS of the table: an entry is only
+		used while its stamp is unchanged.
+	"""
+
+	_instance = None
+	_lock = threading.Lock()
+
+	@classmethod
+	def instance(cls):
+		""" returns the shared cache, None if the SQLite file can't be used """
+		with cls._lock:
+			if cls._instance is None:
+				path = os.path.join(QgsApplication.qgisSettingsDirPath(), u"dbmanager_oracle_cache.db")
+				try:
+					cls._instance = cls(path)
+				except sqlite3.Error, e:
+					QgsMessageLog.logMessage(u"Oracle geometry types cache disabled: %s" % e, 'DBManager', QgsMessageLog.WARNING)
+					cls._instance = False
+		return cls._instance or None
+
+	def __init__(self, path):
+		self._dbLock = threading.Lock()
+		self.db = sqlite3.connect(path, check_same_thread=False)
+		self.db.execute(u"""CREATE TABLE IF NOT EXISTS geomtypes (
+							 conn TEXT, owner TEXT, tablename TEXT, geomcol TEXT,
+							 stamp TEXT, geomtypes TEXT,
+							 PRIMARY KEY (conn, owner, tablename, geomcol) )""")
+		self.db.commit()
+
+	def lookup(self, connName):
+		""" returns a dict (owner, table, column) -> (stamp, wkbTypes list) """
+		with self._dbLock:
+			rows = self.db.execute(u"SELECT owner, tablename, geomcol, stamp, geomtypes FROM geomtypes WHERE conn = ?", (connName,)).fetchall()
+
+		entries = {}
+		for owner, tablename, geomcol, stamp, geomtypes in rows:
+			entries[(owner, tablename, geomcol)] = (stamp, [int(l) for l in geomtypes.split(u",")])
+		return entries
+
+	def store(self, connName, entries):
+		""" entries: list of ((owner, table, column), stamp, wkbTypes list) """
+		rows = [(connName, key[0], key[1], key[2], stamp, u",".join([unicode(l) for l in geomtypes])) for key, stamp, geomtypes in entries]
+		with self._dbLock:
+			self.db.executemany(u"INSERT OR REPLACE INTO geomtypes VALUES (?, ?, ?, ?, ?, ?)", rows)
+			self.db.commit()
+
+	def clear(self, connName):
+		with self._dbLock:
+			self.db.execute(u"DELETE FROM geomtypes WHERE conn = ?", (connName,))
+			self.db.commit()
+
+
 class OracleDBConnector(DBConnector):
+	# wkbTypes of the layer_gtype parameter of spatial indexes
+	layerGTypes = { 'POINT': QGis.WKBPoint,
+			'MULTIPOINT': QGis.WKBMultiPoint,
+			'LINE': QGis.WKBLineString,
+			'CURVE': QGis.WKBLineString,
+			'MULTILINE': QGis.WKBMultiLineString,
+			'MULTICURVE': QGis.WKBMultiLineString,
+			'POLYGON': QGis.WKBPolygon,
+			'SURFACE': QGis.WKBPolygon,
+			'MULTIPOLYGON': QGis.WKBMultiPolygon,
+			'MULTISURFACE': QGis.WKBMultiPolygon }
+
+	# tiers of getTableExtentTier, from the fastest to the slowest:
+	#  index: root MBR of the spatial index (ALL_SDO_INDEX_METADATA)
+	#  tune: SDO_TUNE.EXTENT_OF, only when the column has a spatial index
+	#  sample: SDO_AGGR_MBR over a SAMPLE BLOCK of the table
+	#  full: SDO_AGGR_MBR over the whole table
+	extentTiers = ('index', 'tune', 'sample')
+	# SAMPLE BLOCK percent of the tables without statistics
+	extentSamplePercent = 1.0
+	# tiers whose extent contains every geometry
+	coveringExtentTiers = ('index', 'tune', 'full')
+
 	def __init__(self, uri, connName):
 		DBConnector.__init__(self, uri)
 
@@ -54,13 +243,61 @@ class OracleDBConnector(DBConnector):
                 self.geometryColumnsOnly = uri.param('geometryColumnsOnly').lower() == "true"
                 self.allowGeometrylessTables = uri.param('allowGeometrylessTables').lower() == "true"
                 self.onlyExistingTypes = uri.param('onlyExistingTypes').lower() == "true"
-
+		self.geomTypesBatchSize = self._intParam(uri, 'geomTypesBatchSize', 20)
+		self.geomTypesParallelism = self._intParam(uri, 'geomTypesParallelism', 1)
+		self.geomTypesSampleRows = self._intParam(uri, 'geomTypesSampleRows', 1000)
+		self.geomTypesSampleTimeout = self._intParam(uri, 'geomTypesSampleTimeout', 0)
+		self.geomTypesEscalate = uri.param('geomTypesEscalate').lower() == "true"
+		self.geomTypesCache = OracleGeomTypesCache.instance() if uri.param('geomTypesCache').lower() != "false" else None
+		self.extentTimeout = self._intParam(uri, 'extentTimeout', 0)
+		self.extentParallelism = self._intParam(uri, 'extentParallelism', 1)
+
+		# Session pool options
+		self.poolMinSessions = self._intParam(uri, 'poolMinSessions', 1)
+		self.poolMaxSessions = self._intParam(uri, 'poolMaxSessions', 4)
+		self.poolIncrement = self._intParam(uri, 'poolIncrement', 1)
+		self.poolWaitTimeout = self._intParam(uri, 'poolWaitTimeout', 5000)
+
+		self.connection = None
 		try:
-                        self.connection = cx_Oracle.connect( self.user, self.passwd, self.dbname) 
+			self.pool = OracleSessionPool.instance(self.connName, self.user, self.passwd, self.dbname,
+							       self.poolMinSessions, self.poolMaxSessions, self.poolIncrement)
+			self.connection = self.pool.acquire(self.poolWaitTimeout / 1000.0)
 
-		except self.connection_error_types(), e:
+		except self.connection_error_types() + (cx_Oracle.DatabaseError, OracleSessionPoolExhausted), e:
 			raise ConnectionError(e)
 
+		# prepared statements: client side statement cache of the session
+		# and an LRU of prepared cursors for the catalog queries
+		self.stmtCacheSize = self._intParam(uri, 'stmtCacheSize', 20)
+		self.connection.stmtcachesize = self.stmtCacheSize
+		self._stmt_cursors = OrderedDict()
+
+		# privileges of the session (see getTablePrivileges)
+		self._tabPrivileges = None
+
+		# fetch size policy (see _fetchArraySize)
+		self.fetchArraySize = self._intParam(uri, 'fetchArraySize', 0)
+		self.fetchBytes = self._intParam(uri, 'fetchBytes', 262144)
+		self.sqlMaxRows = self._intParam(uri, 'sqlMaxRows', 1000000)
+		self.sqlTimeout = self._intParam(uri, 'sqlTimeout', 0)
+		self.sqlSpillRows = self._intParam(uri, 'sqlSpillRows', 100000)
+		self.lobDisplaySize = self._intParam(uri, 'lobDisplaySize', 1000)
+		self._charWidth = None
+
+		# geometry type and SRID of the query layers (see getSqlLayerGeomType)
+		self.sqlLayerTypesTtl = self._intParam(uri, 'sqlLayerTypesTtl', 3600)
+		self._sqlLayerTypes = OrderedDict()
+		self.latency = self._measureLatency()
+
+		# worker sessions state (see _runJobs)
+		self._jobsCancelled = threading.Event()
+		self._jobSessions = []
+
+		# sessions of the SQL windows (see sqlSession)
+		self._sqlSessions = {}
+		self._sqlSessionsLock = threading.Lock()
+
                 # Find if we can connect to data_sources_cache.db
                 sqlite_cache_file = os.path.join(QgsApplication.qgisSettingsDirPath(), u"data_sources_cache.db")
                 if (os.path.isfile(sqlite_cache_file)):
@@ -86,6 +323,295 @@ class OracleDBConnector(DBConnector):
 		self._checkSpatial()
 		self._checkGeometryColumnsTable()
                 
+	def __del__(self):
+		""" hand the session back to the pool instead of closing it """
+		# __init__ may have failed (e.g. logon refused) before setting them
+		for owner in getattr(self, '_sqlSessions', {}).keys():
+			self.releaseSqlSession(owner)
+		if getattr(self, 'connection', None) is not None:
+			for c in getattr(self, '_stmt_cursors', {}).values():
+				c.close()
+			self._stmt_cursors = OrderedDict()
+			self._releaseSession(self.connection)
+		self.connection = None
+
+	def _measureLatency(self):
+		""" returns the duration (s) of a round-trip to the server """
+		start = time.time()
+		try:
+			if hasattr(self.connection, 'ping'):
+				self.connection.ping()
+			else:
+				c = self.connection.cursor()
+				c.execute(u"SELECT 1 FROM DUAL")
+				c.fetchall()
+				c.close()
+		except cx_Oracle.Error:
+			return 0.0
+		return time.time() - start
+
+	def _rowWidth(self, description):
+		""" estimated bytes of a row from a cursor description """
+		return sum([min(col[3] or 22, 4000) for col in description])
+
+	def _fetchArraySize(self, width=200):
+		""" rows per round-trip for rows of width bytes: about fetchBytes,
+			up to 8 times more on slow links (5 ms latency or more), unless
+			fetchArraySize is set """
+		if self.fetchArraySize > 0:
+			return self.fetchArraySize
+
+		target = self.fetchBytes * min(max(self.latency / 0.005, 1.0), 8.0)
+		return int(min(max(target / max(width, 1), 50), 10000))
+
+	def _tuneCursor(self, cursor, width=None):
+		""" set the array fetch (and prefetch, cx_Oracle 8) size of a cursor
+			for rows of width bytes, or described by the parsed or executed
+			statement. Left as is when neither is known """
+		if width is None:
+			if cursor.description is None:
+				return cursor
+			width = self._rowWidth(cursor.description)
+		cursor.arraysize = self._fetchArraySize(width)
+		if hasattr(cursor, 'prefetchrows'):
+			cursor.prefetchrows = cursor.arraysize + 1
+		return cursor
+
+	def _execute(self, cursor, sql):
+		# the rows are described once executed: size the next fetches
+		return self._tuneCursor(DBConnector._execute(self, cursor, sql))
+
+	def _get_query_cursor(self, sql, conn=None):
+		""" returns a cursor (of conn if given) tuned for a statement: a query
+			is parsed first (other statements are not, DDL would run on parse) """
+		c = self._get_cursor() if conn is None else conn.cursor()
+		if QRegExp(u"^\\s*(SELECT|WITH)\\b", Qt.CaseInsensitive).indexIn(sql) >= 0:
+			try:
+				c.parse(sql)
+			except self.execution_error_types():
+				# reported by the execution
+				return c
+			self._tuneCursor(c)
+		return c
+
+	def _execute_prepared(self, sql, params):
+		""" execute a statement with bind variables. The cursor stays
+			prepared and is reused the next time the same statement text
+			is run (the least recently used ones are closed) """
+		c = self._stmt_cursors.pop(sql, None)
+		try:
+			if c is None:
+				c = self._get_cursor()
+				c.prepare(sql)
+			c.execute(None, params)
+		except self.connection_error_types(), e:
+			raise ConnectionError(e)
+		except self.execution_error_types(), e:
+			c.close()
+			self._rollback()
+			raise DbError(e, sql)
+
+		# sized on the described rows, for the fetches and the next runs
+		self._tuneCursor(c)
+		self._stmt_cursors[sql] = c
+		while len(self._stmt_cursors) > self.stmtCacheSize:
+			self._stmt_cursors.popitem(last=False)[1].close()
+
+		return c
+
+	def _fetchall_prepared(self, sql, params):
+		""" fetch all rows of a prepared statement. The cursor must not be closed """
+		return self._fetchall(self._execute_prepared(sql, params))
+
+	def _fetchone_prepared(self, sql, params):
+		return self._fetchone(self._execute_prepared(sql, params))
+
+	def _intParam(self, uri, name, default):
+		try:
+			return int(uri.param(name))
+		except ValueError:
+			return default
+
+	def _acquireSession(self, cancelled=None):
+		""" borrow an additional session from the pool (e.g. for a worker
+			thread), waiting poolWaitTimeout ms at most for a busy pool, or
+			until the cancelled Event is set. Raises ConnectionError """
+		try:
+			return self.pool.acquire(self.poolWaitTimeout / 1000.0, cancelled)
+		except self.connection_error_types() + (cx_Oracle.DatabaseError, OracleSessionPoolExhausted), e:
+			raise ConnectionError(e)
+
+	def _releaseSession(self, conn):
+		""" give back a session obtained with _acquireSession """
+		self.pool.release(conn)
+
+	def sqlSession(self, owner, cancelled=None):
+		""" the pooled session running a SQL window statement (owner is the
+			key of its result model), kept until releaseSqlSession, once the
+			statement is done (its rows all fetched), so that idle windows
+			don't hold sessions of the pool. Each statement has its own one:
+			the statements of the windows run at the same time """
+		with self._sqlSessionsLock:
+			conn = self._sqlSessions.get(owner)
+		if conn is None:
+			# may wait for a free session: not on the GUI thread
+			conn = self._acquireSession(cancelled)
+			with self._sqlSessionsLock:
+				self._sqlSessions[owner] = conn
+		return conn
+
+	def releaseSqlSession(self, owner):
+		with self._sqlSessionsLock:
+			conn = self._sqlSessions.pop(owner, None)
+		if conn is not None:
+			self._releaseSession(conn)
+
+	def _execute_on(self, cursor, sql, params=None):
+		""" execute a statement on a cursor of a worker session. Unlike _execute,
+			errors don't roll back the connector connection """
+		try:
+			if params is None:
+				cursor.execute(sql)
+			else:
+				cursor.execute(sql, params)
+		except self.connection_error_types(), e:
+			raise ConnectionError(e)
+		except self.execution_error_types(), e:
+			raise DbError(e, sql)
+		return cursor
+
+	def _fetchmany_on(self, cursor, count, sql=None):
+		""" fetch rows from a cursor of a worker session. Unlike _fetchmany,
+			errors don't roll back the connector connection """
+		try:
+			return cursor.fetchmany(count)
+		except self.connection_error_types(), e:
+			raise ConnectionError(e)
+		except self.execution_error_types(), e:
+			raise DbError(e, sql)
+
+	def _setCallTimeout(self, conn, timeout):
+		""" set the time limit (ms, 0 for none) of each round-trip of a session
+			and return the previous one. Does nothing before cx_Oracle 7.2 """
+		if not hasattr(conn, 'callTimeout'):
+			return 0
+		previous = conn.callTimeout
+		conn.callTimeout = timeout
+		return previous
+
+	def _runJobs(self, jobs, parallelism=1):
+		""" run jobs (callables taking a cursor) and return their results in order.
+			With parallelism > 1 the jobs are spread over worker threads, each
+			one with its own session borrowed from the pool. Otherwise (or if
+			no session is available) they run here with a None cursor, meaning
+			the connector connection. Jobs skipped after cancelJobs() give None.
+			On the GUI thread a progress dialog is shown meanwhile, its Cancel
+			button calls cancelJobs(). """
+		self._jobsCancelled.clear()
+		results = [None] * len(jobs)
+		progress = self._jobsProgress(len(jobs))
+
+		sessions = []
+		if parallelism > 1 and len(jobs) > 1:
+			stats = self.pool.statistics()
+			for n in range(min(parallelism, len(jobs), stats['max'] - stats['busy'])):
+				try:
+					sessions.append(self._acquireSession())
+				except ConnectionError:
+					break
+
+		if len(sessions) == 0:
+			try:
+				for i, job in enumerate(jobs):
+					if progress is not None:
+						# let the Cancel button be clicked between two jobs
+						progress.setValue(i)
+						QApplication.processEvents()
+					if self._jobsCancelled.is_set():
+						break
+					results[i] = job(None)
+			finally:
+				if progress is not None:
+					progress.close()
+			return results
+
+		pending = Queue.Queue()
+		for i in range(len(jobs)):
+			pending.put(i)
+		errors = []
+
+		def worker(conn):
+			c = conn.cursor()
+			try:
+				while not self._jobsCancelled.is_set():
+					try:
+						i = pending.get_nowait()
+					except Queue.Empty:
+						break
+					results[i] = jobs[i](c)
+			except Exception, e:
+				# stop the other workers, unless we are already cancelled
+				if not self._jobsCancelled.is_set():
+					errors.append(e)
+					self._jobsCancelled.set()
+			finally:
+				c.close()
+
+		self._jobSessions = sessions
+		threads = [threading.Thread(target=worker, args=(conn,)) for conn in sessions]
+		for t in threads:
+			t.start()
+		if progress is not None:
+			# wait in an event loop, the GUI stays responsive
+			loop = QEventLoop()
+			timer = QTimer()
+			def poll():
+				progress.setValue(len(jobs) - pending.qsize())
+				if not any([t.is_alive() for t in threads]):
+					loop.quit()
+			QObject.connect(timer, SIGNAL("timeout()"), poll)
+			timer.start(100)
+			loop.exec_()
+			timer.stop()
+			progress.close()
+		for t in threads:
+			t.join()
+		self._jobSessions = []
+
+		for conn in sessions:
+			self._releaseSession(conn)
+
+		if len(errors) > 0:
+			raise errors[0]
+		return results
+
+	def _jobsProgress(self, count):
+		""" returns the progress dialog of _runJobs, None out of the GUI thread """
+		app = QApplication.instance()
+		if app is None or QThread.currentThread() != app.thread():
+			return None
+		progress = QProgressDialog(QApplication.translate("DBManagerPlugin", "Querying the tables..."), QApplication.translate("DBManagerPlugin", "Cancel"),
+					   0, count, QApplication.activeWindow())
+		progress.setWindowModality(Qt.WindowModal)
+		progress.setMinimumDuration(500)
+		QObject.connect(progress, SIGNAL("canceled()"), self.cancelJobs)
+		return progress
+
+	def cancelJobs(self):
+		""" cancel the jobs started by _runJobs: pending jobs are skipped and
+			the queries running on the worker sessions are interrupted.
+			Can be called from any thread """
+		self._jobsCancelled.set()
+		for conn in list(self._jobSessions):
+			try:
+				conn.cancel()
+			except cx_Oracle.Error:
+				pass
+
+	def getPoolStatistics(self):
+		""" returns the session pool statistics (see OracleSessionPool.statistics) """
+		return self.pool.statistics()
+
 	def _connectionInfo(self):
 		return unicode(self._uri.connectionInfo())
 
@@ -144,6 +670,31 @@ class OracleDBConnector(DBConnector):
 	def hasSpatialSupport(self):
 		return self.has_spatial
 
+	def getSystemChangeNumber(self):
+		""" returns the current SCN, None if DBMS_FLASHBACK is not available """
+		try:
+			c = self._execute(None, u"SELECT DBMS_FLASHBACK.GET_SYSTEM_CHANGE_NUMBER FROM DUAL")
+		except DbError:
+			return None
+		res = self._fetchone(c)
+		c.close()
+
+		return res[0] if res is not None else None
+
+	def snapshotTooOld(self, e):
+		""" whether a DbError is a flashback query (AS OF SCN) whose
+			snapshot can't be read any more: ORA-01555 (undo overwritten),
+			ORA-08181 (SCN out of range) """
+		msg = u"%s" % e.msg
+		return 'ORA-01555' in msg or 'ORA-08181' in msg
+
+	def hasOffsetFetch(self):
+		""" row limiting clause (OFFSET/FETCH) is available from Oracle 12c """
+		try:
+			return int(self.connection.version.split('.')[0]) >= 12
+		except (AttributeError, ValueError):
+			return False
+
 	def hasRasterSupport(self):
                 """ No raster support for the moment"""
 		# return self.has_raster
@@ -178,30 +729,50 @@ class OracleDBConnector(DBConnector):
                 # getSChemas request only extract schemas where user has access
 		return ( False, True )
 
+	def _loadPrivileges(self):
+		""" bulk load the object privileges granted to the user, to PUBLIC
+			or to an enabled role, and the ANY TABLE system privileges """
+		sql = u"""SELECT DISTINCT TABLE_SCHEMA, TABLE_NAME, PRIVILEGE
+			  FROM ALL_TAB_PRIVS
+			  WHERE PRIVILEGE IN ('SELECT','INSERT','UPDATE','DELETE')
+			  AND (GRANTEE IN (USER, 'PUBLIC')
+			       OR GRANTEE IN (SELECT ROLE FROM SESSION_ROLES))"""
+		c = self._execute(None, sql)
+		rows = self._fetchall(c)
+		c.close()
+
+		self._tabPrivileges = {}
+		self._tabPrivilegesByName = {}
+		for owner, tablename, privilege in rows:
+			self._tabPrivileges.setdefault( (owner, tablename), set() ).add(privilege)
+			self._tabPrivilegesByName.setdefault( tablename, set() ).add(privilege)
+
+		c = self._execute(None, u"SELECT PRIVILEGE FROM SESSION_PRIVS WHERE PRIVILEGE LIKE '% ANY TABLE'")
+		self._anyPrivileges = set([row[0].split(u" ")[0] for row in self._fetchall(c)])
+		c.close()
+
+	def invalidatePrivilegesCache(self):
+		""" forget the privileges of the session, e.g. after a GRANT or a REVOKE """
+		self._tabPrivileges = None
+
 	def getTablePrivileges(self, table):
 		""" table privileges: (select, insert, update, delete) """
 
 		schema, tablename = self.getSchemaTableName(table)
+		if schema and schema.upper() == self.user.upper():
+			# the owner has all the privileges on its tables
+			return [ True, True, True, True ]
 
-                if schema:
-                        schema_where = u" AND TABLE_SCHEMA = %s" % self.quoteString(schema)
-                else:
-                        schema_where = u""
+		if self._tabPrivileges is None:
+			self._loadPrivileges()
 
-                sql = u"SELECT DISTINCT PRIVILEGE FROM ALL_TAB_PRIVS WHERE privilege IN ('SELECT','INSERT','UPDATE','DELETE') AND TABLE_NAME = %s %s" % (self.quoteString(tablename), schema_where)
-
-		c = self._execute(None, sql)
-		res = self._fetchall(c)
-                c.close()
-
-                result = [ False, False, False, False ]
-                for line in res:
-                        if line[0] == u"SELECT": result[0] = True
-                        if line[0] == u"INSERT": result[1] = True
-                        if line[0] == u"UPDATE": result[2] = True
-                        if line[0] == u"DELETE": result[3] = True
+		if schema:
+			granted = self._tabPrivileges.get( (schema, tablename), set() )
+		else:
+			granted = self._tabPrivilegesByName.get( tablename, set() )
+		granted = granted | self._anyPrivileges
 
-		return result
+		return [ privilege in granted for privilege in (u"SELECT", u"INSERT", u"UPDATE", u"DELETE") ]
 
 
         def getSchemasCache(self):
@@ -436,7 +1007,8 @@ class OracleDBConnector(DBConnector):
                                  NULL as geomtypes,
                                  NULL as wkbtype,
                                  NULL,
-                                 c.srid
+                                 c.srid,
+                                 o.last_ddl_time
                           FROM %s_sdo_geom_metadata c
                                JOIN %s_objects o ON
                                  c.table_name=o.object_name
@@ -454,14 +1026,23 @@ class OracleDBConnector(DBConnector):
                 lst_tables = self._fetchall(c)
                 c.close()
 
-		for i, tbl in enumerate(lst_tables):
-			item = list(tbl)
+                # DDL time and estimated rows tell whether cached geometry types are still valid
+                stamps = [u"%s|%s" % (tbl[-1], tbl[4]) for tbl in lst_tables]
+                lst_tables = [tbl[:-1] for tbl in lst_tables]
+
+                # Resolve the geometry types of all the tables at once
+                probes = []
+		for tbl in lst_tables:
                         if schema:
-                                table_name = u"%s.%s" % (self.quoteId(schema), self.quoteId(item[0]))
+                                table_name = u"%s.%s" % (self.quoteId(schema), self.quoteId(tbl[0]))
                         else:
-                                table_name = self.quoteId(item[0])
-                        geocol = self.quoteId(item[-5])
-                        geomtypes = self.getTableGeomTypes(table_name, geocol)
+                                table_name = self.quoteId(tbl[0])
+                        probes.append( (table_name, self.quoteId(tbl[-5]), tbl[1], tbl[0], tbl[-5]) )
+                lst_geomtypes = self.getTablesGeomTypes(probes, schema, stamps)
+
+		for i, tbl in enumerate(lst_tables):
+			item = list(tbl)
+                        geomtypes = lst_geomtypes[i]
 			item.insert(0, Table.VectorType)
 
                         # Intelligent wkbtype grouping (multi with non multi)
@@ -491,91 +1072,300 @@ class OracleDBConnector(DBConnector):
 
 		return items
 
-        def getTableGeomTypes(self, table, geomCol):
-                """ Return all the wkbTypes for a table by requesting geometry column"""
+        def getTablesGeomTypes(self, tables, schema=None, stamps=None):
+                """ Return the wkbTypes of many geometry columns at once.
+                    tables is a list of (table, geomCol, owner, tablename, column)
+                    where table and geomCol are quoted as for getTableGeomTypes.
+                    With estimated metadata the tables are sampled (see
+                    sampleTableGeomTypes).
+                    Types enforced by a spatial index (layer_gtype) are read from the
+                    index metadata, the other columns are probed geomTypesBatchSize
+                    tables per query, on geomTypesParallelism worker sessions.
+                    If stamps (one per table) are given, the types stored in the
+                    persistent cache with the same stamp are used without probing.
+                    The result list follows the order of tables."""
+
+                results = [None] * len(tables)
+                to_probe = range(len(tables))
+                batch_size = max(1, self.geomTypesBatchSize)
+
+                cache = self.geomTypesCache if stamps is not None else None
+                if cache:
+                        cached = cache.lookup(self.connName)
+                        to_probe = []
+                        for i, t in enumerate(tables):
+                                entry = cached.get( (t[2], t[3], t[4]) )
+                                if entry is not None and entry[0] == stamps[i]:
+                                        results[i] = entry[1]
+                                else:
+                                        to_probe.append(i)
+
+                # optimizer statistics size the samples
+                if self.useEstimatedMetadata and len(to_probe) > 0:
+                        stats = self.getTablesStatistics(schema)
+                        tables = [t[:5] + (stats.get( (t[2], t[3]) ),) for t in tables]
+
+                if batch_size > 1:
+                        layer_types = self.getLayerGeomTypes(schema)
+                        for i in list(to_probe):
+                                t = tables[i]
+                                if (t[2], t[3], t[4]) in layer_types:
+                                        results[i] = list(layer_types[(t[2], t[3], t[4])])
+                                        to_probe.remove(i)
+
+                chunks = [to_probe[start:start + batch_size] for start in range(0, len(to_probe), batch_size)]
+                jobs = [lambda c, chunk=chunk: self._probeGeomTypesChunk([tables[i] for i in chunk], c) for chunk in chunks]
+
+                probed = []
+                for chunk, lst_geomtypes in zip(chunks, self._runJobs(jobs, self.geomTypesParallelism)):
+                        if lst_geomtypes is None:   # cancelled
+                                lst_geomtypes = [None for i in chunk]
+                        for i, geomtypes in zip(chunk, lst_geomtypes):
+                                if geomtypes is None:   # error or timeout: not cached
+                                        geomtypes = [QGis.WKBUnknown]
+                                else:
+                                        probed.append(i)
+                                results[i] = geomtypes
 
-                estimated = u""
-                if self.useEstimatedMetadata:
-                        from qgis.core import QgsMessageLog
-                        QgsMessageLog.logMessage("estimated", 'DBManager', QgsMessageLog.INFO)
-                        estimated = u"AND ROWNUM < 100"
+                if cache and len(probed) > 0:
+                        cache.store(self.connName, [((tables[i][2], tables[i][3], tables[i][4]), stamps[i], results[i]) for i in probed if len(results[i]) > 0])
 
-                # Grab all of geometry types from the layer
-                query =  u"""SELECT DISTINCT a.%s.SDO_GTYPE As gtype
-                           FROM %s a
-                           WHERE a.%s IS NOT NULL %s
-                           ORDER BY a.%s.SDO_GTYPE""" % (geomCol, table, geomCol, estimated, geomCol)
-                
-		try:
-			c = self._execute(None, query)
-		except DbError, e:	# handle error views or other problems
-			return [QGis.WKBUnknown]
+                return results
 
-                rows = self._fetchall(c)
-                c.close()
+        def clearGeomTypesCache(self):
+                """ forget the geometry types cached for this connection """
+                if self.geomTypesCache:
+                        self.geomTypesCache.clear(self.connName)
+                self._sqlLayerTypes.clear()
 
-                # Handle results
-                if len(rows) == 0:
+        def _probeGeomTypesChunk(self, tables, cursor=None):
+                """ Query the geometry types of a few tables, in one round-trip if possible
+                    (None for the tables whose probe failed or timed out) """
+                if len(tables) > 1:
+                        try:
+                                lst_counts = self._probeGeomTypesBatch(tables, cursor)
+                        except DbError, e:    # a view in error: query the tables one by one
+                                pass
+                        else:
+                                lst_geomtypes = []
+                                for t, counts in zip(tables, lst_counts):
+                                        if len(counts) > 1 and self.geomTypesEscalate and self.useEstimatedMetadata:
+                                                counts = self._countGeomTypes(t[0], t[1], full=True, cursor=cursor) or counts
+                                        lst_geomtypes.append(self._gtypesToWkbTypes(sorted(counts)))
+                                return lst_geomtypes
+
+                return [self._probeTableGeomTypes(t[0], t[1], cursor, t[5] if len(t) > 5 else None) for t in tables]
+
+        def getLayerGeomTypes(self, schema=None):
+                """ Return the wkbTypes enforced by spatial indexes created with a
+                    layer_gtype parameter, as a dict keyed by (owner, table, column) """
+
+                schema_where = u"AND i.TABLE_OWNER = :owner" if schema else u""
+                sql = u"""SELECT i.TABLE_OWNER, i.TABLE_NAME, i.COLUMN_NAME, m.SDO_LAYER_GTYPE
+                          FROM ALL_SDO_INDEX_INFO i
+                               JOIN ALL_SDO_INDEX_METADATA m ON
+                                 m.SDO_INDEX_OWNER = i.SDO_INDEX_OWNER
+                                 AND m.SDO_INDEX_NAME = i.INDEX_NAME
+                          WHERE m.SDO_LAYER_GTYPE IS NOT NULL %s""" % schema_where
+
+                try:
+                        rows = self._fetchall_prepared(sql, { 'owner': schema } if schema else {})
+                except DbError, e:    # no access to the spatial index views
+                        return {}
+
+                layer_types = {}
+                for owner, tablename, column, layer_gtype in rows:
+                        wkbType = self.layerGTypes.get(layer_gtype.upper())
+                        if wkbType is not None:
+                                layer_types[(owner, tablename, column)] = [wkbType]
+
+                return layer_types
+
+        def _probeGeomTypesBatch(self, tables, cursor=None):
+                """ Count the geometry types of several tables in one round-trip.
+                    Returns a list of dicts SDO_GTYPE -> rows """
+                parts = []
+                for n, t in enumerate(tables):
+                        percent = self._samplePercent(t[5]) if len(t) > 5 else None
+                        parts.append(u"SELECT %d As probe, gtype, nb_rows FROM (%s)" % (n, self._geomTypesQuery(t[0], t[1], percent)))
+                query = u"\nUNION ALL\n".join(parts)
+
+                if cursor is None:
+                        c = self._execute(None, query)
+                        rows = self._fetchall(c)
+                        c.close()
+                else:
+                        rows = self._fetchall(self._execute_on(cursor, query))
+
+                lst_counts = [{} for t in tables]
+                for probe, gtype, nb_rows in rows:
+                        lst_counts[probe][gtype] = nb_rows
+
+                return lst_counts
+
+        def _geomTypesQuery(self, table, geomCol, percent=None, full=False):
+                """ Return the query counting the rows of each SDO_GTYPE of a geometry column.
+                    With estimated metadata (and unless full is set) it only reads
+                    geomTypesSampleRows rows, taken from a SAMPLE BLOCK of percent
+                    of the table if given """
+                sample = bound = u""
+                if self.useEstimatedMetadata and not full:
+                        if percent is not None:
+                                sample = u"SAMPLE BLOCK (%.6f)" % percent
+                        bound = u"AND ROWNUM <= %d" % self.geomTypesSampleRows
+
+                return u"""SELECT gtype, COUNT(*) As nb_rows
+                           FROM (SELECT a.%s.SDO_GTYPE As gtype
+                                 FROM %s %s a
+                                 WHERE a.%s IS NOT NULL %s)
+                           GROUP BY gtype""" % (geomCol, table, sample, geomCol, bound)
+
+        def getTablesStatistics(self, schema=None):
+                """ Return the optimizer statistics of the tables as a dict
+                    (owner, table) -> (NUM_ROWS, BLOCKS) """
+                schema_where = u"AND OWNER = :owner" if schema else u""
+                sql = u"""SELECT OWNER, TABLE_NAME, NUM_ROWS, BLOCKS
+                          FROM ALL_TAB_STATISTICS
+                          WHERE OBJECT_TYPE = 'TABLE' AND NUM_ROWS IS NOT NULL %s""" % schema_where
+
+                try:
+                        rows = self._fetchall_prepared(sql, { 'owner': schema } if schema else {})
+                except DbError, e:
+                        return {}
+
+                return dict([((row[0], row[1]), (row[2], row[3])) for row in rows])
+
+        def _samplePercent(self, stats):
+                """ Return the SAMPLE BLOCK percentage giving about geomTypesSampleRows
+                    rows of a table with (NUM_ROWS, BLOCKS) statistics, None when the
+                    table is small enough to be read (or has no statistics) """
+                if stats is None or not stats[0] or not stats[1]:
+                        return None
+
+                num_rows, blocks = stats
+                # rows come by whole blocks: take at least a few of them
+                percent = max(100.0 * self.geomTypesSampleRows / num_rows, 100.0 * min(blocks, 8) / blocks)
+                if percent >= 100.0:
+                        return None
+
+                return max(percent, 0.000001)
+
+        def _countGeomTypes(self, table, geomCol, percent=None, full=False, cursor=None):
+                """ Run the _geomTypesQuery (within geomTypesSampleTimeout unless full)
+                    and return a dict SDO_GTYPE -> rows, None on error """
+                query = self._geomTypesQuery(table, geomCol, percent, full)
+                conn = self.connection if cursor is None else cursor.connection
+                timeout = self.geomTypesSampleTimeout if self.useEstimatedMetadata and not full else 0
+                previous = self._setCallTimeout(conn, timeout)
+
+                try:
+                        if cursor is None:
+                                c = self._execute(None, query)
+                                rows = self._fetchall(c)
+                                c.close()
+                        else:
+                                rows = self._fetchall(self._execute_on(cursor, query))
+                except DbError, e:    # handle error views, sampling not allowed or too long
+                        return None
+                finally:
+                        self._setCallTimeout(conn, previous)
+
+                return dict(rows)
+
+        def sampleTableGeomTypes(self, table, geomCol, stats=None, cursor=None):
+                """ Count the rows of each SDO_GTYPE of a geometry column.
+                    table and geomCol are quoted, table can be a "(query)".
+                    With estimated metadata only a sample is read: a SAMPLE BLOCK
+                    sized from the (NUM_ROWS, BLOCKS) stats of the table if given,
+                    the first rows otherwise. If the sample has mixed types and
+                    geomTypesEscalate is set, the whole table is read instead.
+                    Returns (counts, confidence) where counts is a dict
+                    SDO_GTYPE -> rows (None on error) and confidence the chance
+                    that a type found in 1% of the rows has been seen (1.0 when
+                    every row has been read). """
+
+                if not self.useEstimatedMetadata:
+                        return self._countGeomTypes(table, geomCol, cursor=cursor), 1.0
+
+                percent = self._samplePercent(stats)
+                counts = self._countGeomTypes(table, geomCol, percent, cursor=cursor)
+                if counts is None and percent is not None:
+                        # SAMPLE is not allowed on some views, or took too long
+                        percent = None
+                        counts = self._countGeomTypes(table, geomCol, cursor=cursor)
+                if counts is None:
+                        return None, 0.0
+
+                if len(counts) > 1 and self.geomTypesEscalate:
+                        full_counts = self._countGeomTypes(table, geomCol, full=True, cursor=cursor)
+                        if full_counts is not None:
+                                return full_counts, 1.0
+
+                nb_rows = sum(counts.values())
+                if percent is None and nb_rows < self.geomTypesSampleRows:
+                        return counts, 1.0
+
+                return counts, 1.0 - 0.99 ** nb_rows
+
+        def _gtypesToWkbTypes(self, gtypes):
+                """ Convert a list of SDO_GTYPEs into a list of wkbTypes """
+                if len(gtypes) == 0:
                         return [QGis.WKBUnknown]
 
-                # A dict to store the geomtypes
                 geomtypes = []
+                for gtype in gtypes:
+                        if gtype == 2001: geomtypes.append(QGis.WKBPoint)
+                        elif gtype == 2002: geomtypes.append(QGis.WKBLineString)
+                        elif gtype == 2003: geomtypes.append(QGis.WKBPolygon)
+                        elif gtype == 2005: geomtypes.append(QGis.WKBMultiPoint)
+                        elif gtype == 2006: geomtypes.append(QGis.WKBMultiLineString)
+                        elif gtype == 2007: geomtypes.append(QGis.WKBMultiPolygon)
+
+                return geomtypes
 
-                for row in rows:
-                        if row[0] == 2001: geomtypes.append(QGis.WKBPoint)
-                        elif row[0] == 2002: geomtypes.append(QGis.WKBLineString)
-                        elif row[0] == 2003: geomtypes.append(QGis.WKBPolygon)
-                        elif row[0] == 2005: geomtypes.append(QGis.WKBMultiPoint)
-                        elif row[0] == 2006: geomtypes.append(QGis.WKBMultiLineString)
-                        elif row[0] == 2007: geomtypes.append(QGis.WKBMultiPolygon)
+        def getTableGeomTypes(self, table, geomCol, cursor=None, stats=None):
+                """ Return all the wkbTypes for a table by requesting geometry column
+                    (on the cursor of a worker session if given)"""
 
+                geomtypes = self._probeTableGeomTypes(table, geomCol, cursor, stats)
+                if geomtypes is None:     # handle error views or other problems
+                        return [QGis.WKBUnknown]
                 return geomtypes
 
+        def _probeTableGeomTypes(self, table, geomCol, cursor=None, stats=None):
+                """ getTableGeomTypes, None on error or timeout """
 
-        def getTableMainGeomType(self, table, geomCol):
-                """ Return the best wkbType for a table by requesting geometry column"""
+                counts, confidence = self.sampleTableGeomTypes(table, geomCol, stats, cursor)
+                if counts is None:
+                        return None
 
-                wkbType = QGis.WKBUnknown
+                if confidence < 1.0:
+                        QgsMessageLog.logMessage(u"%s: geometry types estimated with %.1f%% confidence" % (table, confidence * 100), 'DBManager', QgsMessageLog.INFO)
 
-                estimated = u""
-                if self.useEstimatedMetadata:
-                        estimated = u"AND ROWNUM < 100"
-
-                # Grab all of geometry types from the layer
-                query =  u"""SELECT DISTINCT a.%s.SDO_GTYPE As gtype,
-                                  COUNT(a.%s.SDO_GTYPE) As nb_rows
-                           FROM %s a
-                           WHERE a.%s IS NOT NULL %s
-                           GROUP BY a.%s.SDO_GTYPE
-                           ORDER BY nb_rows DESC""" % (geomCol, geomCol, table, geomCol, estimated, geomCol)
-                
-                # A dict to handle geometry types weight
-                geom_types = { 'Point' : 0,
-                               'MultiPoint' : 0,
-                               'Linestring' : 0,
-                               'MultiLinestring' : 0,
-                               'Polygon' : 0,
-                               'MultiPolygon' : 0 }
+                return self._gtypesToWkbTypes(sorted(counts))
 
-		try:
-			c = self._execute(None, query)
-		except DbError, e:	# handle error views or other problems
-			return QGis.WKBUnknown
 
-                rows = self._fetchall(c)
-                c.close()
+        def getTableMainGeomType(self, table, geomCol, stats=None):
+                """ Return the best wkbType for a table by requesting geometry column"""
+
+                counts, confidence = self.sampleTableGeomTypes(table, geomCol, stats)
+                return self._mainWkbType(counts)
+
+        def _mainWkbType(self, counts):
+                """ Return the best wkbType for a dict SDO_GTYPE -> rows """
+                wkbType = QGis.WKBUnknown
 
                 # Handle results
-                if len(rows) == 0:
+                if not counts:
                         return QGis.WKBUnknown
 
-                for row in rows:
-                        if row[0] == 2001: geom_types['Point'] = row[1]
-                        elif row[0] == 2002: geom_types['Linestring'] = row[1]
-                        elif row[0] == 2003: geom_types['Polygon'] = row[1]
-                        elif row[0] == 2005: geom_types['MultiPoint'] = row[1]
-                        elif row[0] == 2006: geom_types['MultiLinestring'] = row[1]
-                        elif row[0] == 2007: geom_types['MultiPolygon'] = row[1]
+                # A dict to handle geometry types weight
+                geom_types = { 'Point' : counts.get(2001, 0),
+                               'MultiPoint' : counts.get(2005, 0),
+                               'Linestring' : counts.get(2002, 0),
+                               'MultiLinestring' : counts.get(2006, 0),
+                               'Polygon' : counts.get(2003, 0),
+                               'MultiPolygon' : counts.get(2007, 0) }
 
                 # Make the decision:
                 champion = list(sorted(geom_types, key=geom_types.__getitem__, reverse=True))[0]
@@ -598,22 +1388,256 @@ class OracleDBConnector(DBConnector):
                 
                 return wkbType
 
+	# query layers whose geometry type is kept
+	sqlLayerTypesCount = 100
+
+	def getSqlLayerGeomType(self, sql, geomCol):
+		""" returns (wkbType, srid) of the geometry column of a query, read
+			in one round trip on its first geomTypesSampleRows geometries.
+			Kept, by query text (whitespace normalized) and column, for
+			sqlLayerTypesTtl seconds in a LRU of the last sqlLayerTypesCount
+			queries. (WKBUnknown, None) on error """
+		key = (u" ".join(sql.split()).rstrip(u";"), geomCol)
+		now = time.time()
+		entry = self._sqlLayerTypes.pop(key, None)
+		if entry is not None and now - entry[2] < self.sqlLayerTypesTtl:
+			self._sqlLayerTypes[key] = entry
+			return entry[:2]
+
+		query = u"""SELECT gtype, srid, COUNT(*)
+			    FROM (SELECT a.%s.SDO_GTYPE As gtype, a.%s.SDO_SRID As srid
+				  FROM (%s\n) a
+				  WHERE a.%s IS NOT NULL AND ROWNUM <= :nb_rows)
+			    GROUP BY gtype, srid""" % (geomCol, geomCol, sql, geomCol)
+		c = self._get_cursor()
+		try:
+			res = self._execute_on(c, query, { 'nb_rows': self.geomTypesSampleRows }).fetchall()
+		except DbError:
+			return QGis.WKBUnknown, None
+		finally:
+			c.close()
 
-	def getTableRowCount(self, table):
-                """ returns the number of rows of the table """
-		c = self._execute(None, u"SELECT COUNT(*) FROM %s" % self.quoteId(table))
-		res = self._fetchone(c)[0]
-		c.close()
+		counts = {}
+		srids = {}
+		for gtype, srid, nb_rows in res:
+			counts[int(gtype)] = counts.get(int(gtype), 0) + nb_rows
+			if srid is not None:
+				srids[int(srid)] = srids.get(int(srid), 0) + nb_rows
+		wkbType = self._mainWkbType(counts)
+		srid = max(srids, key=srids.get) if srids else None
+
+		self._sqlLayerTypes[key] = (wkbType, srid, now)
+		while len(self._sqlLayerTypes) > self.sqlLayerTypesCount:
+			self._sqlLayerTypes.popitem(last=False)
+		return wkbType, srid
+
+
+	def getTableRowCount(self, table, cursor=None, scn=None, where=None, params=None):
+                """ returns the number of rows of the table (counted on cursor,
+                    of a worker session, if given, and as of scn if given),
+                    only those matching the where condition (with bound
+                    params) if given """
+		sql = u"SELECT COUNT(*) FROM %s" % self.quoteId(table)
+		if scn is not None:
+			sql = u"%s AS OF SCN %d" % (sql, scn)
+		if where is not None:
+			sql = u"%s WHERE %s" % (sql, where)
+		if cursor is not None:
+			return self._execute_on(cursor, sql, params).fetchone()[0]
 
-		return res
+		c = self._get_cursor()
+		try:
+			res = self._execute_on(c, sql, params).fetchone()[0]
+		finally:
+			c.close()
 
-	def getTableFields(self, table):
-		""" return list of columns in table """
+		return res
 
+	def estimateTableRowCount(self, table, sample=False):
+		""" estimate the number of rows of a table from its optimizer
+			statistics if they are up to date, else from the size of its
+			segment (BLOCKS x rows per block of the last statistics) and,
+			if sample is set, from a SAMPLE BLOCK count.
+			Returns (rows, sure): rows is None when nothing is known, sure
+			tells whether the estimate can be trusted (fresh statistics,
+			empty segment, density known from statistics or whole table
+			sampled) """
 		schema, tablename = self.getSchemaTableName(table)
-		schema_where = u" AND a.OWNER=%s " % self.quoteString(schema) if schema is not None else ""
 
-                sql = u"""SELECT a.COLUMN_ID As ordinal_position,
+		sql = u"""SELECT NUM_ROWS, BLOCKS, STALE_STATS
+			  FROM ALL_TAB_STATISTICS
+			  WHERE OWNER = :owner AND TABLE_NAME = :tbl AND OBJECT_TYPE = 'TABLE'"""
+		try:
+			stats = self._fetchone_prepared(sql, { 'owner': schema, 'tbl': tablename })
+		except DbError, e:
+			stats = None
+		num_rows, blocks, stale = stats if stats is not None else (None, None, None)
+
+		if num_rows is not None and stale == 'NO':
+			return num_rows, True
+
+		rows, sure = num_rows, False
+		segment_blocks = self._segmentBlocks(schema, tablename)
+		if segment_blocks == 0:
+			# no segment allocated: the table is empty
+			return 0, True
+		elif segment_blocks is not None:
+			if num_rows and blocks:
+				rows, sure = int(segment_blocks * float(num_rows) / blocks), True
+			else:
+				# no statistics: about 100 rows per 8k block
+				rows = segment_blocks * 100
+			blocks = segment_blocks
+
+		if sample and not sure:
+			# read about 8 blocks, 1% if the size is unknown
+			percent = 100.0 * 8 / blocks if blocks else 1.0
+			if percent >= 100.0:
+				sql = u"SELECT COUNT(*) FROM %s" % self.quoteId(table)
+			else:
+				sql = u"SELECT COUNT(*) * 100 / %.6f FROM %s SAMPLE BLOCK (%.6f)" % (percent, self.quoteId(table), percent)
+
+			try:
+				c = self._execute(None, sql)
+				rows, sure = int(self._fetchone(c)[0]), percent >= 100.0
+				c.close()
+			except DbError, e:	# views can't always be sampled
+				pass
+
+		return rows, sure
+
+	# tables stored in TABLE (or TABLE PARTITION) segments
+	_heapTableWhere = u"""AND t.IOT_TYPE IS NULL AND t.CLUSTER_NAME IS NULL
+				  AND (t.TABLESPACE_NAME IS NOT NULL OR t.PARTITIONED = 'YES')"""
+
+	def _segmentBlocks(self, schema, tablename):
+		""" returns the number of blocks of the segments of a table (0 if
+			none is allocated), None if unknown (views, or the segments of
+			other users without access to DBA_SEGMENTS). Tables whose rows
+			are not in a TABLE segment of their own (index-organized,
+			clustered, external, temporary) are unknown """
+		if schema is None or schema.upper() == self.user.upper():
+			sql = u"""SELECT NVL(SUM(s.BLOCKS), 0)
+				  FROM USER_TABLES t
+				       LEFT JOIN USER_SEGMENTS s ON
+					 s.SEGMENT_NAME = t.TABLE_NAME AND s.SEGMENT_TYPE LIKE 'TABLE%%'
+				  WHERE t.TABLE_NAME = :tbl %s
+				  GROUP BY t.TABLE_NAME""" % self._heapTableWhere
+			params = { 'tbl': tablename }
+		else:
+			sql = u"""SELECT NVL(SUM(s.BLOCKS), 0)
+				  FROM DBA_TABLES t
+				       LEFT JOIN DBA_SEGMENTS s ON
+					 s.OWNER = t.OWNER AND s.SEGMENT_NAME = t.TABLE_NAME AND s.SEGMENT_TYPE LIKE 'TABLE%%'
+				  WHERE t.OWNER = :owner AND t.TABLE_NAME = :tbl %s
+				  GROUP BY t.TABLE_NAME""" % self._heapTableWhere
+			params = { 'owner': schema, 'tbl': tablename }
+
+		try:
+			res = self._fetchone_prepared(sql, params)
+		except DbError, e:	# no access to DBA_SEGMENTS
+			return None
+
+		return int(res[0]) if res is not None else None
+
+	def nativeOutputTypeHandler(self, cursor, name, defaultType, size, precision, scale):
+		""" cursor.outputtypehandler fetching native values: numbers which
+			don't fit a float as Decimal, LOBs inline (binary data as buffer)
+			and dates as datetime (the default) """
+		if defaultType == cx_Oracle.NUMBER and scale != 0 and (precision == 0 or precision > 15):
+			return cursor.var(cx_Oracle.STRING, 255, cursor.arraysize, outconverter=decimal.Decimal)
+		if defaultType in (cx_Oracle.CLOB, cx_Oracle.NCLOB):
+			return cursor.var(cx_Oracle.LONG_STRING, arraysize=cursor.arraysize)
+		if defaultType == cx_Oracle.BLOB:
+			return cursor.var(cx_Oracle.LONG_BINARY, arraysize=cursor.arraysize, outconverter=buffer)
+		if defaultType == cx_Oracle.BINARY:
+			return cursor.var(cx_Oracle.BINARY, size, cursor.arraysize, outconverter=buffer)
+
+	def lobOutputTypeHandler(self, cursor, name, defaultType, size, precision, scale):
+		""" cursor.outputtypehandler reading only the first lobDisplaySize
+			characters or bytes of the LOBs (binary data as buffer), from
+			their locator while it is valid: the rest is never transferred """
+		limit = self.lobDisplaySize
+		if defaultType in (cx_Oracle.CLOB, cx_Oracle.NCLOB):
+			def cut(lob):
+				v = lob.read(1, limit + 1)
+				return v if len(v) <= limit else v[:limit] + u"\u2026"
+			return cursor.var(defaultType, arraysize=cursor.arraysize, outconverter=cut)
+		if defaultType == cx_Oracle.BLOB:
+			return cursor.var(defaultType, arraysize=cursor.arraysize,
+					  outconverter=lambda lob: buffer(lob.read(1, limit)))
+
+	def lobDisplayLength(self, dataType):
+		""" number of characters (bytes of BLOBs) of a LOB or XMLType value
+			shown in the data grid: lobDisplaySize, within the 2000 bytes of
+			the RAW or the 4000 bytes of the VARCHAR2 (NVARCHAR2 of NCLOBs)
+			read by lobDisplaySql, one character being kept for the ellipsis """
+		dataType = dataType.lower()
+		if dataType in ("blob", "nclob"):
+			return max(1, min(self.lobDisplaySize, 1999))
+		return max(1, min(self.lobDisplaySize, 4000 // self._maxBytesPerChar() - 1))
+
+	def _maxBytesPerChar(self):
+		""" maximum bytes of a character in the database character set,
+			from the bits in its name (WE8MSWIN1252, JA16SJIS, AL32UTF8),
+			4 if unknown """
+		if self._charWidth is None:
+			self._charWidth = 4
+			try:
+				res = self._fetchone_prepared(u"SELECT VALUE FROM NLS_DATABASE_PARAMETERS WHERE PARAMETER = 'NLS_CHARACTERSET'", {})
+			except DbError:
+				res = None
+			if res is not None and res[0]:
+				charset = res[0].upper()
+				bits = re.match(r"^[A-Z]+(\d+)", charset)
+				if charset == "UTF8":
+					self._charWidth = 3
+				elif bits is not None and int(bits.group(1)) >= 8:
+					self._charWidth = int(bits.group(1)) // 8
+		return self._charWidth
+
+	def lobDisplaySql(self, column, dataType):
+		""" expression reading the beginning of a LOB or XMLType column on the
+			server: one more character (byte) than lobDisplayLength, telling
+			that the value goes on (see readLob) """
+		column = self.quoteId(column)
+		if dataType.lower() == "xmltype":
+			column = u"XMLSERIALIZE(CONTENT %s AS CLOB)" % column
+		return u"DBMS_LOB.SUBSTR(%s, %d, 1)" % (column, self.lobDisplayLength(dataType) + 1)
+
+	def readLob(self, table, column, dataType, keyCol, key, scn=None):
+		""" returns the whole value of a LOB or XMLType column in the row of
+			the table whose keyCol (ROWID or a quoted column) is key, as of
+			scn if given, None if the row is gone """
+		expr = self.quoteId(column)
+		if dataType.lower() == "xmltype":
+			expr = u"XMLSERIALIZE(CONTENT %s AS CLOB)" % expr
+		table_txt = self.quoteId(table)
+		params = { 'key': key }
+		if scn is not None:
+			table_txt = u"%s AS OF SCN :scn" % table_txt
+			params['scn'] = scn
+		sql = u"SELECT %s FROM %s WHERE %s = %s" % (expr, table_txt, keyCol, u"CHARTOROWID(:key)" if keyCol == u"ROWID" else u":key")
+
+		c = self._get_cursor()
+		c.outputtypehandler = self.nativeOutputTypeHandler
+		try:
+			res = self._execute_on(c, sql, params).fetchone()
+		finally:
+			c.close()
+		return res[0] if res is not None else None
+
+	def _bindSchemaTable(self, schema, tablename):
+		""" bind variables for the catalog queries filtering on :tbl and optionally :owner """
+		params = { 'tbl': tablename }
+		if schema is not None:
+			params['owner'] = schema
+		return params
+
+	def _tableFieldsSql(self, schema):
+		schema_where = u" AND a.OWNER=:owner " if schema is not None else ""
+
+                return u"""SELECT a.COLUMN_ID As ordinal_position,
                                  a.COLUMN_NAME As column_name,
                                  a.DATA_TYPE As data_type,
                                  a.DATA_LENGTH As char_max_len,
@@ -628,61 +1652,53 @@ class OracleDBConnector(DBConnector):
                                     a.TABLE_NAME = c.TABLE_NAME
                                     AND a.COLUMN_NAME = c.COLUMN_NAME
                                     AND a.OWNER = c.OWNER
-                          WHERE a.TABLE_NAME= %s %s
-                          ORDER BY a.COLUMN_ID"""  % (self.quoteString(tablename), schema_where)
+                          WHERE a.TABLE_NAME= :tbl %s
+                          ORDER BY a.COLUMN_ID"""  % schema_where
 
-		c = self._execute(None, sql)
-		res = self._fetchall(c)
-		c.close()
-		return res
+	def getTableFields(self, table):
+		""" return list of columns in table """
 
-	def getTableIndexes(self, table):
-		""" get info about table's indexes """
 		schema, tablename = self.getSchemaTableName(table)
-		schema_where = u" AND i.OWNER=%s " % self.quoteString(schema) if schema is not None else ""
+		return self._fetchall_prepared(self._tableFieldsSql(schema), self._bindSchemaTable(schema, tablename))
 
-                sql = u"""SELECT i.index_name, c.COLUMN_NAME, i.uniqueness
+	def _tableIndexesSql(self, schema):
+		schema_where = u" AND i.OWNER=:owner " if schema is not None else ""
+
+                return u"""SELECT i.index_name, c.COLUMN_NAME, i.uniqueness
                           FROM ALL_INDEXES i
                           INNER JOIN ALL_IND_COLUMNS c ON i.index_name = c.index_name
-                          WHERE i.table_name = %s %s""" % (self.quoteString(tablename), schema_where)
-
-		c = self._execute(None, sql)
-		res = self._fetchall(c)
-		c.close()
+                          WHERE i.table_name = :tbl %s""" % schema_where
 
-		return res
+	def getTableIndexes(self, table):
+		""" get info about table's indexes """
+		schema, tablename = self.getSchemaTableName(table)
+		return self._fetchall_prepared(self._tableIndexesSql(schema), self._bindSchemaTable(schema, tablename))
 
 
-	def getTableConstraints(self, table):
-		schema, tablename = self.getSchemaTableName(table)
-		schema_where = u" AND c.OWNER=%s " % self.quoteString(schema) if schema is not None else ""
+	def _tableConstraintsSql(self, schema):
+		schema_where = u" AND c.OWNER=:owner " if schema is not None else ""
 
-                sql = u"""SELECT a.CONSTRAINT_NAME, a.CONSTRAINT_TYPE, a.DEFERRABLE, a.DEFERRED, c.COLUMN_NAME, 
+                return u"""SELECT a.CONSTRAINT_NAME, a.CONSTRAINT_TYPE, a.DEFERRABLE, a.DEFERRED, c.COLUMN_NAME, 
                                  a.SEARCH_CONDITION
                           FROM ALL_CONS_COLUMNS c
                                INNER JOIN ALL_CONSTRAINTS a ON a.CONSTRAINT_NAME = c.CONSTRAINT_NAME
-                          WHERE c.TABLE_NAME = %s %s"""  % (self.quoteString(tablename), schema_where)
+                          WHERE c.TABLE_NAME = :tbl %s"""  % schema_where
 
-		c = self._execute(None, sql)
-		res = self._fetchall(c)
-		c.close()
+	def getTableConstraints(self, table):
+		schema, tablename = self.getSchemaTableName(table)
+		return self._fetchall_prepared(self._tableConstraintsSql(schema), self._bindSchemaTable(schema, tablename))
 
-		return res
 
+	def _tableTriggersSql(self, schema):
+		schema_where = u" AND TABLE_OWNER = :owner " if schema is not None else ""
 
-	def getTableTriggers(self, table):
-		schema, tablename = self.getSchemaTableName(table)
-                
-                sql = u"""SELECT TRIGGER_NAME, TRIGGERING_EVENT, TRIGGER_TYPE, STATUS
+                return u"""SELECT TRIGGER_NAME, TRIGGERING_EVENT, TRIGGER_TYPE, STATUS
                           FROM ALL_TRIGGERS
-                          WHERE TABLE_OWNER = %s
-                          AND TABLE_NAME=%s""" % (self.quoteString(schema), self.quoteString(tablename))
-
-		c = self._execute(None, sql)
-		res = self._fetchall(c)
-		c.close()
+                          WHERE TABLE_NAME = :tbl %s""" % schema_where
 
-		return res
+	def getTableTriggers(self, table):
+		schema, tablename = self.getSchemaTableName(table)
+		return self._fetchall_prepared(self._tableTriggersSql(schema), self._bindSchemaTable(schema, tablename))
 
 	def enableAllTableTriggers(self, enable, table):
 		""" enable or disable all triggers on table """
@@ -708,7 +1724,7 @@ class OracleDBConnector(DBConnector):
                 # TODO: rebuild index
 		schema, tablename = self.getSchemaTableName(table)
 
-                res = [str(l) for l in self.getTableExtent(table, geom)]
+                res = [str(l) for l in self.getTableExtent(table, geom, tiers=self.coveringExtentTiers)]
                 
                 if self.getTablePrivileges('ALL_SDO_GEOM_METADATA')[2]:
                         sql = u"""UPDATE ALL_SDO_GEOM_METADATA SET DIMINFO =
@@ -728,79 +1744,294 @@ class OracleDBConnector(DBConnector):
 
 		self._execute_and_commit(sql)
 
-	def getTableExtent(self, table, geom):
-		""" find out table extent """
+	def getTableExtent(self, table, geom, budget=None, tiers=None):
+		""" find out table extent (see getTableExtentTier) """
+		return self.getTableExtentTier(table, geom, budget, tiers)[0]
+
+	def getTableExtentTier(self, table, geom, budget=None, tiers=None, stats=None, rootMBRs=None, cursor=None):
+		""" find out table extent with the first of the tiers (extentTiers by
+			default) giving one, within budget ms (extentTimeout by default,
+			0 for none). A query overrunning the budget is cancelled with
+			cx_Oracle 7.2 or later. stats are the (NUM_ROWS, BLOCKS) of the
+			table, used to size the sample, rootMBRs the _spatialIndexRootMBRs
+			of its schema and cursor the one of a worker session (see _runJobs).
+			Returns (extent, tier), extent being (xmin, xmax, ymin, ymax) and
+			tier the one which produced it (None, None if none did) """
 		schema, tablename = self.getSchemaTableName(table)
-                tablename = "'%s.%s'" % (schema, tablename)
-                # if table as spatial index:
-                if self.getTableIndexes(table):
-                        sql = u"SELECT SDO_TUNE.EXTENT_OF(%s, %s).SDO_ORDINATES FROM DUAL" % (tablename, self.quoteString(geom))
-                else:
-                        sql =u"SELECT SDO_AGGR_MBR(%s).SDO_ORDINATES FROM %s" % (self.quoteId(geom), self.quoteId(table))
+		tiers = tiers or self.extentTiers
+		budget = self.extentTimeout if budget is None else budget
+		deadline = time.time() + budget / 1000.0 if budget else None
+
+		index = None
+		if 'index' in tiers or 'tune' in tiers:
+			if rootMBRs is None:
+				rootMBRs = self._spatialIndexRootMBRs(schema, tablename, geom, cursor)
+			index = rootMBRs.get( (tablename, geom) )
+
+		for tier in tiers:
+			timeout = None
+			if deadline is not None:
+				timeout = int((deadline - time.time()) * 1000)
+				if timeout <= 0:
+					break
+
+			res = None
+			if tier == 'index':
+				res = index[0] if index else None
+			elif tier == 'tune' and index:
+				# the index exists but its root MBR is not usable
+				sql = u"SELECT SDO_TUNE.EXTENT_OF(:tbl, :col).SDO_ORDINATES FROM DUAL"
+				res = self._mbrExtent(self._extentOrdinates(sql, { 'tbl': u"%s.%s" % (schema, tablename), 'col': geom }, timeout, cursor))
+			elif tier == 'sample':
+				if stats is None and cursor is None:
+					stats = self.getTablesStatistics(schema).get( (schema, tablename) )
+				if stats is None or not stats[0] or not stats[1]:
+					# no statistics: the size of the table is unknown,
+					# never read it all
+					percent = self.extentSamplePercent
+				else:
+					percent = self._samplePercent(stats)
+				if percent is None:
+					# small table: read it all
+					tier = 'full'
+				sample = u"SAMPLE BLOCK (%.6f)" % percent if percent is not None else u""
+				sql = u"SELECT SDO_AGGR_MBR(a.%s).SDO_ORDINATES FROM %s %s a" % (self.quoteId(geom), self.quoteId(table), sample)
+				res = self._mbrExtent(self._extentOrdinates(sql, timeout=timeout, cursor=cursor))
+			elif tier == 'full':
+				sql = u"SELECT SDO_AGGR_MBR(%s).SDO_ORDINATES FROM %s" % (self.quoteId(geom), self.quoteId(table))
+				res = self._mbrExtent(self._extentOrdinates(sql, timeout=timeout, cursor=cursor))
+
+			if res is not None:
+				return res, tier
+
+		return None, None
+
+	def _mbrExtent(self, ordinates, dims=None):
+		""" returns the (xmin, xmax, ymin, ymax) of the SDO_ORDINATES of a
+			MBR (lower corner then upper corner, of dims dimensions, half
+			the ordinates by default: 2D, 3D or LRS), None if none """
+		if not ordinates:
+			return None
+		dims = dims or len(ordinates) // 2
+		if dims < 2 or len(ordinates) < 2 * dims:
+			return None
+		return (ordinates[0], ordinates[dims], ordinates[1], ordinates[dims + 1])
+
+	def _spatialIndexRootMBRs(self, schema, tablename=None, geom=None, cursor=None):
+		""" returns a dict (table, column) -> (root MBR extent or None,)
+			of the spatial indexes of a schema (of a column if given), see
+			_mbrExtent. The root MBR of geodetic indexes is in geocentric
+			coordinates: their extent is None """
+		column_where = u"AND i.TABLE_NAME = :tbl AND i.COLUMN_NAME = :col" if tablename is not None else u""
+		sql = u"""SELECT i.TABLE_NAME, i.COLUMN_NAME, m.SDO_ROOT_MBR.SDO_ORDINATES,
+				 m.SDO_INDEX_DIMS, m.SDO_INDEX_GEODETIC
+			  FROM ALL_SDO_INDEX_INFO i
+			       JOIN ALL_SDO_INDEX_METADATA m ON
+				 m.SDO_INDEX_OWNER = i.SDO_INDEX_OWNER
+				 AND m.SDO_INDEX_NAME = i.INDEX_NAME
+			  WHERE i.TABLE_OWNER = :owner %s""" % column_where
+		params = { 'owner': schema }
+		if tablename is not None:
+			params.update({ 'tbl': tablename, 'col': geom })
 
 		try:
-			c = self._execute(None, sql)
-		except DbError, e:	# no spatial index on table, try aggregation
-                        return None
+			if cursor is None:
+				rows = self._fetchall_prepared(sql, params)
+			else:
+				rows = self._execute_on(cursor, sql, params).fetchall()
+		except DbError, e:	# no access to the spatial index views
+			return {}
 
-		res = self._fetchone(c)[0]
-		c.close()
+		return dict([((row[0], row[1]), (self._mbrExtent(row[2], row[3]) if row[4] != 'TRUE' else None,)) for row in rows])
 
-                if res is not None:
-                        res = (res[0],res[2],res[1],res[3])
+	def _extentOrdinates(self, sql, params=None, timeout=None, cursor=None):
+		""" run an extent query, within timeout ms if given, and return the
+			SDO_ORDINATES of the MBR, None on error or timeout """
+		conn = self.connection if cursor is None else cursor.connection
+		previous = self._setCallTimeout(conn, max(timeout, 1)) if timeout is not None else None
+		try:
+			if cursor is not None:
+				res = self._execute_on(cursor, sql, params).fetchone()
+			elif params is not None:
+				res = self._fetchone_prepared(sql, params)
+			else:
+				c = self._execute(None, sql)
+				res = self._fetchone(c)
+				c.close()
+		except DbError, e:
+			return None
+		finally:
+			if timeout is not None:
+				self._setCallTimeout(conn, previous)
 
-		return tuple(res) if res is not None else None
+		return res[0] if res is not None else None
 
-	def getTableEstimatedExtent(self, table, geom):
-		""" find out estimated extent (from metadata view) """
-		schema, tablename = self.getSchemaTableName(table)
-             
-                sql = u"SELECT sdo_lb,sdo_ub FROM mdsys.all_sdo_geom_metadata m, table(m.diminfo) WHERE owner=%s AND table_name=%s AND column_name=%s AND sdo_dimname='X'" %(self.quoteString(schema), self.quoteString(tablename), self.quoteString(geom))
+	def spatialFilterSql(self, geomCol, extent, srid=None, literal=False):
+		""" returns (condition, params) keeping the rows whose geometry may
+			interact with the extent (xmin, ymin, xmax, ymax): SDO_FILTER
+			primary filter, answered by the spatial index. The values are
+			written in the condition (params None) if literal is set """
+		values = { 'wsrid': srid, 'wxmin': extent[0], 'wymin': extent[1], 'wxmax': extent[2], 'wymax': extent[3] }
+		if literal:
+			names = dict([(k, u"NULL" if v is None else repr(float(v))) for k, v in values.iteritems()])
+		else:
+			names = dict([(k, u":%s" % k) for k in values])
+		window = u"SDO_GEOMETRY(2003, %(wsrid)s, NULL, SDO_ELEM_INFO_ARRAY(1, 1003, 3), SDO_ORDINATE_ARRAY(%(wxmin)s, %(wymin)s, %(wxmax)s, %(wymax)s))" % names
+		condition = u"SDO_FILTER(%s, %s) = 'TRUE'" % (self.quoteId(geomCol), window)
+		return condition, None if literal else values
+
+	def getSridEpsg(self, srid):
+		""" returns the EPSG code of an Oracle SRID (e.g. 4326 for 8307),
+			None if it has none or the mapping is not available """
+		try:
+			res = self._fetchone_prepared(u"SELECT SDO_CS.MAP_ORACLE_SRID_TO_EPSG(:srid) FROM DUAL", { 'srid': srid })
+		except DbError:
+			return None
+		return int(res[0]) if res is not None and res[0] is not None else None
 
+	def getSridWkt(self, srid):
+		""" returns the WKT of the coordinate system of an Oracle SRID, None
+			if unknown """
 		try:
-			c = self._execute(None, sql)
-		except DbError, e:	# no statistics for the current table
+			res = self._fetchone_prepared(u"SELECT WKTEXT FROM MDSYS.CS_SRS WHERE SRID = :srid", { 'srid': srid })
+		except DbError:
 			return None
+		return res[0] if res is not None else None
 
-		res_x = self._fetchone(c)
-		c.close()
+	def updateExtentsMetadata(self, schema):
+		""" update the DIMINFO of every geometry column of a schema with its
+			extent (covering tiers only, see getTableExtentTier). The extents
+			are computed on extentParallelism sessions, then the metadata is
+			updated with a single array DML and commit.
+			Returns a report: list of (table, column, extent, tier, seconds) """
+		sql = u"SELECT TABLE_NAME, COLUMN_NAME FROM ALL_SDO_GEOM_METADATA WHERE OWNER = :owner ORDER BY TABLE_NAME, COLUMN_NAME"
+		columns = self._fetchall_prepared(sql, { 'owner': schema })
+		stats = self.getTablesStatistics(schema)
+		rootMBRs = self._spatialIndexRootMBRs(schema)
+
+		def extentJob(tablename, geom):
+			def job(cursor):
+				start = time.time()
+				extent, tier = self.getTableExtentTier( (schema, tablename), geom, 0, self.coveringExtentTiers,
+									 stats.get( (schema, tablename) ), rootMBRs, cursor )
+				return (tablename, geom, extent, tier, time.time() - start)
+			return job
+
+		report = self._runJobs([extentJob(row[0], row[1]) for row in columns], self.extentParallelism)
+		report = [r for r in report if r is not None]
+
+		rows = [{ 'xmin': r[2][0], 'xmax': r[2][1], 'ymin': r[2][2], 'ymax': r[2][3], 'tbl': r[0], 'col': r[1] }
+			for r in report if r[2] is not None]
+		if len(rows) == 0:
+			return report
+
+		diminfo = u"""MDSYS.SDO_DIM_ARRAY(MDSYS.SDO_DIM_ELEMENT('X', :xmin, :xmax, 0.005),
+					       MDSYS.SDO_DIM_ELEMENT('Y', :ymin, :ymax, 0.005) )"""
+		if self.getTablePrivileges('ALL_SDO_GEOM_METADATA')[2]:
+			sql = u"UPDATE ALL_SDO_GEOM_METADATA SET DIMINFO = %s WHERE OWNER = :owner AND TABLE_NAME = :tbl AND COLUMN_NAME = :col" % diminfo
+			for row in rows:
+				row['owner'] = schema
+		elif schema.lower() == self.user.lower() and self.getTablePrivileges('USER_SDO_GEOM_METADATA')[2]:
+			sql = u"UPDATE USER_SDO_GEOM_METADATA SET DIMINFO = %s WHERE TABLE_NAME = :tbl AND COLUMN_NAME = :col" % diminfo
+		else:
+			# nothing to do, you don't have sufficient rights...
+			return report
 
-                if res_x:
-                        if len(res_x) < 2:
-                                return None
-                else:
-                        return None
+		c = self._get_cursor()
+		try:
+			c.executemany(sql, rows)
+		except self.connection_error_types(), e:
+			raise ConnectionError(e)
+		except self.execution_error_types(), e:
+			self._rollback()
+			raise DbError(e, sql)
+		finally:
+			c.close()
+		self._commit()
 
-                sql = u"SELECT sdo_lb,sdo_ub FROM mdsys.all_sdo_geom_metadata m, table(m.diminfo) WHERE owner=%s AND table_name=%s AND column_name=%s AND sdo_dimname='Y'" %(self.quoteString(schema), self.quoteString(tablename), self.quoteString(geom))
+		return report
 
-                try:
-			c = self._execute(None, sql)
+	def _estimatedExtentSql(self):
+		return u"SELECT sdo_dimname,sdo_lb,sdo_ub FROM mdsys.all_sdo_geom_metadata m, table(m.diminfo) WHERE owner=:owner AND table_name=:tbl AND column_name=:col AND sdo_dimname IN ('X', 'Y')"
+
+	def _extentFromDimRows(self, rows):
+		""" (xmin, xmax, ymin, ymax) from the (dimname, lb, ub) rows of the DIMINFO """
+		bounds = dict([(row[0], row[1:]) for row in rows])
+		if 'X' not in bounds or 'Y' not in bounds:
+			return None
+
+		return (bounds['X'][0], bounds['X'][1], bounds['Y'][0], bounds['Y'][1])
+
+	def getTableEstimatedExtent(self, table, geom):
+		""" find out estimated extent (from metadata view) """
+		schema, tablename = self.getSchemaTableName(table)
+
+		try:
+			rows = self._fetchall_prepared(self._estimatedExtentSql(), { 'owner': schema, 'tbl': tablename, 'col': geom })
 		except DbError, e:	# no statistics for the current table
 			return None
 
-		res_y = self._fetchone(c)
-		c.close()
+		return self._extentFromDimRows(rows)
 
-                if res_y:
-                        if len(res_y) < 2:
-                                return None
-                else:
-                        return None
+	def describeTable(self, table, geom=None, srid=None):
+		""" fetch the fields, constraints, indexes, triggers and privileges of a
+			table, the estimated extent of its geom column and the name of srid
+			(if given) with a single PL/SQL call opening one REF CURSOR each
+			(the privileges come from the session privileges cache).
+			Returns a dict with 'fields', 'constraints', 'indexes', 'triggers'
+			(rows as returned by the getTable* methods), 'privileges' (as
+			getTablePrivileges), 'estimatedExtent' and 'srsName' """
+		schema, tablename = self.getSchemaTableName(table)
+		schema = schema or None
+		params = self._bindSchemaTable(schema, tablename)
+
+		sections = [ ('constraints', self._tableConstraintsSql(schema)),
+			     ('indexes', self._tableIndexesSql(schema)),
+			     ('triggers', self._tableTriggersSql(schema)),
+			     ('fields', self._tableFieldsSql(schema)) ]
+		if geom is not None and schema is not None and self.has_spatial:
+			sections.append( ('extent', self._estimatedExtentSql()) )
+			params['col'] = geom
+		if srid is not None and srid != -1 and self.has_spatial:
+			sections.append( ('srs', u"SELECT CS_NAME FROM MDSYS.CS_SRS WHERE SRID = :srid") )
+			params['srid'] = srid
+
+		# each REF CURSOR is prefetched with the call itself (see _tuneCursor),
+		# before it is described: catalog rows with comments and defaults
+		refs = []
+		for name, query in sections:
+			ref = self._tuneCursor(self._get_cursor(), 4000)
+			params[u"cur_%s" % name] = ref
+			refs.append(ref)
+
+		block = u"BEGIN\n%s\nEND;" % u"\n".join([u"OPEN :cur_%s FOR %s;" % (name, query) for name, query in sections])
 
-		return (res_x[0], res_x[1], res_y[0], res_y[1])
+		c = self._get_cursor()
+		try:
+			self._execute_on(c, block, params)
+			rows = dict([(name, self._fetchall(ref)) for (name, query), ref in zip(sections, refs)])
+		finally:
+			for ref in refs:
+				ref.close()
+			c.close()
 
+		return { 'constraints': rows['constraints'],
+			 'indexes': rows['indexes'],
+			 'triggers': rows['triggers'],
+			 'fields': rows['fields'],
+			 'privileges': self.getTablePrivileges(table),
+			 'estimatedExtent': self._extentFromDimRows(rows['extent']) if 'extent' in rows else None,
+			 'srsName': rows['srs'][0][0] if len(rows.get('srs', [])) > 0 else None }
 
 	def getViewDefinition(self, view):
 		""" returns definition of the view """
 
 		schema, tablename = self.getSchemaTableName(view)
-		schema_where = u" AND OWNER=%s " % self.quoteString(schema) if schema is not None else ""
+		schema_where = u" AND OWNER=:owner " if schema is not None else ""
 
-		sql = u"""SELECT TEXT FROM ALL_VIEWS WHERE VIEW_NAME = %s %s""" % (self.quoteString(tablename), schema_where)
+		sql = u"""SELECT TEXT FROM ALL_VIEWS WHERE VIEW_NAME = :tbl %s""" % schema_where
 
-		c = self._execute(None, sql)
-		res = self._fetchone(c)
-		c.close()
+		res = self._fetchone_prepared(sql, self._bindSchemaTable(schema, tablename))
 
 		return res[0] if res is not None else None
 
@@ -810,11 +2041,9 @@ class OracleDBConnector(DBConnector):
 			return
 
 		try:
-			c = self._execute(None, "SELECT CS_NAME FROM MDSYS.CS_SRS WHERE SRID = %d" % srid)
+			sr = self._fetchone_prepared(u"SELECT CS_NAME FROM MDSYS.CS_SRS WHERE SRID = :srid", { 'srid': srid })
 		except DbError, e:
 			return
-		sr = self._fetchone(c)
-		c.close()
 
 		return sr[0] if sr is not None else None
 
@@ -823,11 +2052,9 @@ class OracleDBConnector(DBConnector):
                 """ determine if a table is a vector one by looking into metadata view """
 		if self.has_geometry_columns and self.has_geometry_columns_access:
 			schema, tablename = self.getSchemaTableName(table)
-			sql = u"SELECT count(*) FROM all_sdo_geom_metadata WHERE owner = %s AND table_name = %s" % (self.quoteString(schema), self.quoteString(tablename))
+			sql = u"SELECT count(*) FROM all_sdo_geom_metadata WHERE owner = :owner AND table_name = :tbl"
 
-			c = self._execute(None, sql)
-			res = self._fetchone(c)
-			c.close()
+			res = self._fetchone_prepared(sql, { 'owner': schema, 'tbl': tablename })
 			return res != None and res[0] > 0
 
 		return False
@@ -1026,15 +2253,13 @@ class OracleDBConnector(DBConnector):
 
 	def isGeometryColumn(self, table, column):
 		schema, tablename = self.getSchemaTableName(table)
-		schema_where = u"AND owner = %s " % self.quoteString(schema) if schema is not None else ""
+		schema_where = u"AND owner = :owner " if schema is not None else ""
                 
-		sql = u"SELECT count(*) FROM all_sdo_geom_metadata WHERE table_name=%s AND column_name = %s %s" % (self.quoteString(tablename), self.quoteString(column.upper()), schema_where)
+		sql = u"SELECT count(*) FROM all_sdo_geom_metadata WHERE table_name = :tbl AND column_name = :col %s" % schema_where
 
-		c = self._execute(None, sql)
-		res = self._fetchone(c)[0] > 0
-
-		c.close()
-		return res
+		params = self._bindSchemaTable(schema, tablename)
+		params['col'] = column.upper()
+		return self._fetchone_prepared(sql, params)[0] > 0
 
 	def addGeometryColumn(self, table, geom_column='GEOM', geom_type='POINT', srid=-1, dim=2):
                 """ Add a geometry column and update Oracle Spatial metadata."""
@@ -1113,10 +2338,6 @@ class OracleDBConnector(DBConnector):
 	def connection_error_types(self):
 		return cx_Oracle.InterfaceError, cx_Oracle.OperationalError
 
-	# moved into the parent class: DbConnector._execute()
-	#def _execute(self, cursor, sql):
-	#	pass
-
 	# moved into the parent class: DbConnector._execute_and_commit()
 	#def _execute_and_commit(self, sql):
 	#	pass
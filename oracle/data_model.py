@@ -27,97 +27,1118 @@ from PyQt4.QtCore import *
 from PyQt4.QtGui import *
 
 from ..data_model import TableDataModel, SqlResultModel, BaseTableModel
-from ..plugin import BaseError
+from ..plugin import BaseError, ConnectionError, DbError, TableConstraint
 from qgis.core import *
 
+import sys
+import struct
+import threading
+import datetime
+import decimal
+import mmap
+import tempfile
+import cPickle
+from array import array
+from collections import OrderedDict
+
+
+wkbTypeNames = { 1: u"POINT", 2: u"LINESTRING", 3: u"POLYGON", 4: u"MULTIPOINT",
+		 5: u"MULTILINESTRING", 6: u"MULTIPOLYGON", 7: u"GEOMETRYCOLLECTION" }
+
+def _wkbGeometry(wkb, offset, parts):
+	""" read the geometry at offset: appends the (ordinates, dimension) of
+		each of its point lists to parts, the ordinates read at once in an
+		array. Returns (type, offset after the geometry) """
+	order = '<' if wkb[offset] == '\x01' else '>'
+	gtype, = struct.unpack_from(order + 'I', wkb, offset + 1)
+	offset += 5
+
+	# EWKB flags, then ISO Z/M/ZM types
+	dims = 2
+	if gtype & 0x80000000:
+		dims += 1
+	if gtype & 0x40000000:
+		dims += 1
+	if gtype & 0x20000000:
+		offset += 4
+	gtype &= 0x0fffffff
+	dims += { 1: 1, 2: 1, 3: 2 }.get(gtype // 1000, 0)
+	gtype %= 1000
+
+	def points(offset, count):
+		ords = array('d')
+		ords.fromstring( wkb[offset:offset + 8 * dims * count] )
+		if (order == '<') != (sys.byteorder == 'little'):
+			ords.byteswap()
+		parts.append( (ords, dims) )
+		return offset + 8 * dims * count
+
+	if gtype == 1:
+		return gtype, points(offset, 1)
+
+	count, = struct.unpack_from(order + 'I', wkb, offset)
+	offset += 4
+	if gtype == 2:
+		offset = points(offset, count)
+	elif gtype == 3:
+		for i in xrange(count):
+			n, = struct.unpack_from(order + 'I', wkb, offset)
+			offset = points(offset + 4, n)
+	elif gtype in wkbTypeNames:
+		for i in xrange(count):
+			offset = _wkbGeometry(wkb, offset, parts)[1]
+	else:
+		raise ValueError(gtype)
+	return gtype, offset
+
+def wkbSummary(wkb):
+	""" returns (type name, number of vertices, (xmin, ymin, xmax, ymax) or
+		None when empty) of a WKB geometry, None if it can't be read """
+	wkb = str(wkb)
+	parts = []
+	try:
+		gtype = _wkbGeometry(wkb, 0, parts)[0]
+	except (struct.error, ValueError, IndexError):
+		return None
+
+	vertices = 0
+	bbox = None
+	for ords, dims in parts:
+		xs = [x for x in ords[0::dims] if x == x]	# empty points are NaN
+		ys = [y for y in ords[1::dims] if y == y]
+		vertices += len(xs)
+		if len(xs) > 0:
+			part = (min(xs), min(ys), max(xs), max(ys))
+			bbox = part if bbox is None else (min(bbox[0], part[0]), min(bbox[1], part[1]), max(bbox[2], part[2]), max(bbox[3], part[3]))
+	return wkbTypeNames[gtype], vertices, bbox
+
+
+class ORColumn(object):
+	""" values of a result column, typed from its first value: integers
+		or floats in an array (with a null flag per row), strings encoded
+		with a dictionary while they are few. Other values, or values not
+		fitting the type, are kept in a list """
+
+	# dictionary encoding stops beyond that many distinct strings when
+	# they are more than half the values
+	maxWords = 65536
+
+	def __init__(self):
+		self.kind = None
+		self.count = 0
+
+	def extend(self, values):
+		if self.kind is None:
+			first = [v for v in values if v is not None][:1]
+			if len(first) == 0:
+				# all NULL so far
+				self.count += len(values)
+				return
+			self._start(first[0])
+
+		try:
+			self._extend(values)
+		except (TypeError, OverflowError):
+			self._toList()
+			self.values.extend(values)
+		self.count += len(values)
+
+		if self.kind == 'str' and len(self.words) > self.maxWords and len(self.words) > self.count / 2:
+			# too many distinct strings to be worth it
+			self._toList()
+
+	def _start(self, first):
+		if type(first) in (int, long):
+			self.kind, typecode = 'int', 'l'
+		elif type(first) == float:
+			self.kind, typecode = 'float', 'd'
+		elif type(first) in (str, unicode):
+			self.kind = 'str'
+			self.words = [None]
+			self.codes = { None: 0 }
+			self.values = array('i', [0] * self.count)
+			return
+		else:
+			self.kind = 'list'
+			self.values = [None] * self.count
+			return
+
+		self.values = array(typecode, [0] * self.count)
+		self.nulls = bytearray([1] * self.count)
+
+	def _extend(self, values):
+		if self.kind == 'list':
+			self.values.extend(values)
+
+		elif self.kind == 'str':
+			codes = []
+			for v in values:
+				code = self.codes.get(v)
+				if code is None:
+					if type(v) not in (str, unicode):
+						raise TypeError(v)
+					code = self.codes[v] = len(self.words)
+					self.words.append(v)
+				codes.append(code)
+			self.values.extend( array('i', codes) )
+
+		else:
+			types = (int, long) if self.kind == 'int' else (float,)
+			for v in values:
+				if v is not None and type(v) not in types:
+					raise TypeError(v)
+			# built first: a failure must not leave a partial batch
+			batch = array(self.values.typecode, [0 if v is None else v for v in values])
+			self.values.extend(batch)
+			self.nulls.extend( bytearray([v is None for v in values]) )
+
+	def _toList(self):
+		if self.kind != 'list':
+			self.values = [self.value(i) for i in xrange(self.count)]
+			self.kind = 'list'
+
+	def value(self, i):
+		if self.kind is None:
+			return None
+		if self.kind == 'list':
+			return self.values[i]
+		if self.kind == 'str':
+			return self.words[self.values[i]]
+		if self.nulls[i]:
+			return None
+		return self.values[i]
+
+
+class ORColumnStore(object):
+	""" rows of a result kept column by column (see ORColumn), behaving as
+		a sequence of row tuples """
+
+	def __init__(self, ncols):
+		self.columns = [ORColumn() for i in range(ncols)]
+		self._len = 0
+
+	def __len__(self):
+		return self._len
+
+	def extend(self, rows):
+		rows = list(rows)
+		if len(rows) == 0:
+			return
+		for column, values in zip(self.columns, zip(*rows)):
+			column.extend(values)
+		self._len += len(rows)
+
+	def append(self, row):
+		self.extend([row])
+
+	def value(self, row, col):
+		return self.columns[col].value(row)
+
+	def __getitem__(self, row):
+		if isinstance(row, slice):
+			return [self[i] for i in xrange(*row.indices(self._len))]
+		if row < 0:
+			row += self._len
+		if row < 0 or row >= self._len:
+			raise IndexError(row)
+		return tuple([column.value(row) for column in self.columns])
+
+	def __iter__(self):
+		for i in xrange(self._len):
+			yield self[i]
+
+	def sort(self, key=None, reverse=False):
+		""" sort the rows, as list.sort """
+		if key is None:
+			order = sorted(xrange(self._len), key=lambda i: self[i], reverse=reverse)
+		else:
+			order = sorted(xrange(self._len), key=lambda i: key(self[i]), reverse=reverse)
+
+		columns = self.columns
+		self.columns = [ORColumn() for column in columns]
+		for column, old in zip(self.columns, columns):
+			column.extend([old.value(i) for i in order])
+
+
+class _SpilledBuffer(str):
+	""" binary value (buffer, which can't be unpickled) in a spilled row """
+	pass
+
+
+class ORSpillStore(object):
+	""" rows of a result: the first memoryRows in an ORColumnStore, the
+		next ones pickled to a temporary file and read back through a
+		memory map, with the end offset of each row in an array. Sorting
+		only permutes an index of the rows """
+
+	# values written as they are, the others as text (e.g. LOB locators)
+	picklable = (int, long, float, str, unicode, bool, decimal.Decimal, datetime.datetime, datetime.date)
+
+	def __init__(self, ncols, memoryRows):
+		self.memory = ORColumnStore(ncols)
+		self.memoryRows = memoryRows
+		self._file = None
+		self._map = None
+		self._ends = array('d')
+		self._order = None
+
+	def __len__(self):
+		return len(self.memory) + len(self._ends)
+
+	def extend(self, rows):
+		rows = list(rows)
+		start = len(self)
+
+		room = self.memoryRows - len(self.memory)
+		if room > 0:
+			self.memory.extend(rows[:room])
+			rows = rows[room:]
+
+		if len(rows) > 0:
+			if self._file is None:
+				self._file = tempfile.TemporaryFile(prefix="dbmanager_oracle_")
+			end = self._ends[-1] if len(self._ends) > 0 else 0
+			data = []
+			for row in rows:
+				row = tuple([self._spilled(v) for v in row])
+				data.append( cPickle.dumps(row, 2) )
+				end += len(data[-1])
+				self._ends.append(end)
+			self._file.seek(0, 2)
+			self._file.write("".join(data))
+
+		if self._order is not None:
+			self._order.extend( xrange(start, len(self)) )
+
+	def append(self, row):
+		self.extend([row])
+
+	def _row(self, physical):
+		if physical < len(self.memory):
+			return self.memory[physical]
+
+		k = physical - len(self.memory)
+		start = int(self._ends[k - 1]) if k > 0 else 0
+		end = int(self._ends[k])
+		if self._map is None or len(self._map) < end:
+			# rows have been written since the file was mapped
+			self._file.flush()
+			if self._map is not None:
+				self._map.close()
+			self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+		return tuple([buffer(v) if isinstance(v, _SpilledBuffer) else v for v in cPickle.loads(self._map[start:end])])
+
+	def _spilled(self, v):
+		if v is None or isinstance(v, self.picklable):
+			return v
+		if isinstance(v, buffer):
+			return _SpilledBuffer(v)
+		return unicode(v)
+
+	def _physical(self, row):
+		return self._order[row] if self._order is not None else row
+
+	def value(self, row, col):
+		physical = self._physical(row)
+		if physical < len(self.memory):
+			return self.memory.value(physical, col)
+		return self._row(physical)[col]
+
+	def __getitem__(self, row):
+		if isinstance(row, slice):
+			return [self[i] for i in xrange(*row.indices(len(self)))]
+		if row < 0:
+			row += len(self)
+		if row < 0 or row >= len(self):
+			raise IndexError(row)
+		return self._row(self._physical(row))
+
+	def __iter__(self):
+		for i in xrange(len(self)):
+			yield self[i]
+
+	def sort(self, key=None, reverse=False):
+		""" sort the rows, as list.sort, by permuting the index """
+		rows = self._order if self._order is not None else xrange(len(self))
+		if key is None:
+			order = sorted(rows, key=self._row, reverse=reverse)
+		else:
+			order = sorted(rows, key=lambda p: key(self._row(p)), reverse=reverse)
+		self._order = array('l', order)
+
+	def close(self):
+		""" delete the temporary file """
+		if self._map is not None:
+			self._map.close()
+			self._map = None
+		if self._file is not None:
+			self._file.close()
+			self._file = None
+
+
+class ORSessionThread(QThread):
+	""" run a job (runOn) on a session of the pool, borrowed for the job
+		unless given. The job can be cancelled from the GUI thread """
+
+	def __init__(self, db, session=None, parent=None):
+		QThread.__init__(self, parent)
+		self.db = db
+		self.error = None
+		self._session = session
+		self._ownSession = session is None
+		self._sessionLock = threading.Lock()
+		self._running = False
+		self._cancelled = threading.Event()
+
+	def session(self):
+		""" the session of the job, None while it is not borrowed """
+		return self._session
+
+	def run(self):
+		try:
+			if self._ownSession:
+				# cancel() stops the wait for a busy pool
+				self._session = self.db._acquireSession(self._cancelled)
+			with self._sessionLock:
+				if self._cancelled.is_set():
+					return
+				self._running = True
+
+			self.runOn(self._session)
+
+		except (DbError, ConnectionError), e:
+			# cancelled, or failed
+			if not self._cancelled.is_set():
+				self.error = e
+		finally:
+			with self._sessionLock:
+				self._running = False
+				if self._ownSession and self._session is not None:
+					self.db._releaseSession(self._session)
+					self._session = None
+
+	def runOn(self, session):
+		pass
+
+	def cancelled(self):
+		return self._cancelled.is_set()
+
+	def cancel(self):
+		""" interrupt the job, or its wait for a session """
+		with self._sessionLock:
+			self._cancelled.set()
+			if self._running:
+				try:
+					self._session.cancel()
+				except self.db.connection_error_types() + self.db.execution_error_types():
+					pass
+
+	# jobs left to finish on their own (see detach)
+	_detached = set()
+
+	def detach(self):
+		""" let the job finish on its own, without waiting for it on the GUI
+			thread: a reference is kept until it is finished """
+		ORSessionThread._detached.add(self)
+		QObject.connect(self, SIGNAL("finished()"), lambda: ORSessionThread._detached.discard(self))
+		if self.isFinished():
+			ORSessionThread._detached.discard(self)
+
+
+class ORRowCountThread(ORSessionThread):
+	""" count the rows of a table on a session borrowed from the pool """
+
+	def __init__(self, table, scn=None, parent=None, where=None, params=None):
+		ORSessionThread.__init__(self, table.database().connector, None, parent)
+		self.tableName = (table.schemaName(), table.name)
+		self.scn = scn
+		self.where = where
+		self.params = params
+		self.rowCount = None
+
+	def runOn(self, session):
+		c = session.cursor()
+		try:
+			self.rowCount = self.db.getTableRowCount(self.tableName, c, self.scn, self.where, self.params)
+		except DbError, e:
+			if self.scn is None or self.cancelled() or not self.db.snapshotTooOld(e):
+				raise
+			# the snapshot is too old: count the current rows
+			self.rowCount = self.db.getTableRowCount(self.tableName, c, None, self.where, self.params)
+		finally:
+			c.close()
+
+
+class ORSqlExecuteThread(ORSessionThread):
+	""" execute a SQL window statement on the session of its result model
+		(owner) and fetch the first array of rows """
+
+	def __init__(self, db, sql, owner, parent=None):
+		ORSessionThread.__init__(self, db, None, parent)
+		self._ownSession = False
+		self.sql = sql
+		self.owner = owner
+		self.cursor = None
+		self.header = []
+		self.rows = []
+
+	def run(self):
+		try:
+			self._session = self.db.sqlSession(self.owner, self._cancelled)
+		except ConnectionError, e:
+			if not self._cancelled.is_set():
+				self.error = e
+			return
+		ORSessionThread.run(self)
+
+	def runOn(self, session):
+		c = self.db._get_query_cursor(self.sql, session)
+		c.outputtypehandler = self.db.lobOutputTypeHandler
+		previous = self.db._setCallTimeout(session, self.db.sqlTimeout)
+		try:
+			self.db._execute_on(c, self.sql)
+			self.header = self.db._get_cursor_columns(c) or []
+			if len(self.header) > 0:
+				count = c.arraysize
+				if self.db.sqlMaxRows > 0:
+					count = min(count, self.db.sqlMaxRows)
+				self.rows = self.db._fetchmany_on(c, count, self.sql)
+		except (DbError, ConnectionError):
+			c.close()
+			session.rollback()
+			raise
+		finally:
+			self.db._setCallTimeout(session, previous)
+
+		self.cursor = c
+
 class ORTableDataModel(TableDataModel):
+	""" table data read by pages, each one with a query of its own: sought
+		on the key (primary key or ROWID) in key order, else skipped to with
+		OFFSET/FETCH (ROWNUM before Oracle 12c) in a total order (the sort
+		column then the key). The pages around the viewport are kept in a
+		LRU cache. Every page is read as of the SCN of the opening, so
+		that they stay consistent without a cursor kept open. Sorting
+		(header click) and the data filter of the table are done by the
+		server """
+
+	# rows per page and number of pages kept
+	pageSize = 200
+	cachedPages = 8
+	# geometries summarized per query, summaries kept
+	geomBatch = 100
+	cachedSummaries = 10000
+
 	def __init__(self, table, parent=None):
-		self.cursor = None
+		self._pages = OrderedDict()
+		self._pageKeys = {}
+		self._counter = None
+		self._rowCount = None
+		self._orderBy = None
+		self._summaries = OrderedDict()
+		self._lobValues = OrderedDict()
 		TableDataModel.__init__(self, table, parent)
+		self._scn = self.db.getSystemChangeNumber()
+		self._takeSnapshot = False
 
-		if self.table.rowCount == None:
-			self.table.refreshRowCount()
-			if self.table.rowCount == None:
-				return
+		self._key = self._pagingKey()
+		self._offsetFetch = self.db.hasOffsetFetch()
+		# geometry columns shown as a summary of the painted rows
+		self._geomCols = [i for i, fld in enumerate(self.table.fields()) if fld.dataType.lower() == "sdo_geometry"]
+		# LOB columns read cut (see _sanitizeTableField), whole on demand
+		self._lobCols = dict([(i, fld.dataType.lower()) for i, fld in enumerate(self.table.fields()) if fld.dataType.lower() in self.lobTypes])
+		self._where, self._whereParams = self._filterClause()
+
+		# a page is a round-trip, at least pageSize rows
+		self._rowWidth = sum([min(fld.charMaxLen or 22, 4000) for fld in self.table.fields()])
+		self.pageSize = max(self.pageSize, min(self.db._fetchArraySize(self._rowWidth), 5000))
+
+		# show the grid at once with the estimated number of rows (or the
+		# first page of the filtered ones), the exact one is counted in
+		# the background
+		self._rowCount = self.table.rowCount if self._where is None else None
+		if self._rowCount == None:
+			if self._where is None:
+				self._rowCount = self.table.estimatedRowCount
+			else:
+				self._rowCount = len(self._page(0))
+			if self._rowCount >= self.pageSize or self._where is None:
+				self._counter = ORRowCountThread(self.table, self._scn, None, self._where, self._whereParams)
+				self.connect(self._counter, SIGNAL("finished()"), self._rowCountFinished)
+				self._counter.start()
+		self.connect(self.table, SIGNAL("aboutToChange"), self._clearPages)
+
+		# header clicks sort on the server (see sort), start in key order
+		if hasattr(parent, 'setSortingEnabled'):
+			parent.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+			parent.setSortingEnabled(True)
+
+	def rowCount(self, index=None):
+		return self._rowCount if self._rowCount else 0
+
+	def _rowCountFinished(self):
+		rowCount = self._counter.rowCount
+		self._counter = None
+		if rowCount == None:
+			return
+
+		if self._where is None:
+			self.table.rowCount = rowCount
+		if rowCount > self._rowCount:
+			self.beginInsertRows(QModelIndex(), self._rowCount, rowCount - 1)
+			self._rowCount = rowCount
+			self.endInsertRows()
+		elif rowCount < self._rowCount:
+			self.beginRemoveRows(QModelIndex(), rowCount, self._rowCount - 1)
+			self._rowCount = rowCount
+			self.endRemoveRows()
+
+	def _cancelRowCount(self):
+		if self._counter is None:
+			return
+
+		self.disconnect(self._counter, SIGNAL("finished()"), self._rowCountFinished)
+		self._counter.cancel()
+		self._counter.detach()
+		self._counter = None
+
+	def getData(self, row, col):
+		try:
+			return TableDataModel.getData(self, row, col)
+		except IndexError:
+			# the estimated row count was too high
+			return None
+
+	def data(self, index, role):
+		val = TableDataModel.data(self, index, role)
+		if role == Qt.DisplayRole:
+			# values are fetched native, format only the painted ones (from
+			# the fetched value, val is already the text of the base class)
+			raw = self.getData(index.row(), index.column())
+			if isinstance(raw, decimal.Decimal):
+				return unicode(raw)
+			if isinstance(raw, datetime.datetime):
+				return raw.isoformat(' ')
+			if isinstance(raw, buffer) and index.column() not in self._lobCols:
+				# RAW (e.g. GUIDs) in hex, as Oracle shows it
+				return str(raw).encode('hex').upper()
+			if val is not None and index.column() in self._geomCols:
+				summary = self._geometrySummary(index.row(), index.column())
+				if summary is not None:
+					return summary
+			if raw is not None and index.column() in self._lobCols:
+				dataType = self._lobCols[index.column()]
+				length = self.db.lobDisplayLength(dataType)
+				if dataType == "blob":
+					raw = str(raw)
+					return raw[:length].encode('hex').upper() + (u"\u2026" if len(raw) > length else u"")
+				return raw[:length] + u"\u2026" if len(raw) > length else raw
+		elif role == Qt.ToolTipRole and index.column() in self._lobCols:
+			# the cut value only: the whole one is read on demand (see
+			# fullValue, Table > Show the full value)
+			return self.data(index, Qt.DisplayRole)
+		return val
+
+	def fullValue(self, row, col):
+		""" the whole value of a cell, read again by the key of its row (as
+			of the snapshot) for the LOB columns. The last ones read are kept """
+		val = self.getData(row, col)
+		if col not in self._lobCols or self._key is None or val is None:
+			return val
+
+		key = self.resdata[row - self.fetchedFrom][len(self.fields)]
+		if (key, col) not in self._lobValues:
+			field = self.table.fields()[col]
+			try:
+				self._lobValues[(key, col)] = self.db.readLob( (self.table.schemaName(), self.table.name), field.name, field.dataType, self._key, key, self._scn )
+			except DbError:
+				return val
+			while len(self._lobValues) > 16:
+				self._lobValues.popitem(last=False)
+		return self._lobValues[(key, col)]
+
+	def _geometrySummary(self, row, col):
+		""" type, vertices and bounding box of a geometry, read with those
+			of the fetched rows around it (see _fetchSummaries) """
+		if self._key is None or not self._geomCols:
+			return None
+		key = self.resdata[row - self.fetchedFrom][len(self.fields)]
+		if key not in self._summaries:
+			self._fetchSummaries(row)
+		summaries = self._summaries.get(key)
+		if summaries is None:
+			return None
+
+		summary = summaries[self._geomCols.index(col)]
+		if summary is None:
+			return None
+		gtype, vertices, bbox = summary
+		if bbox is None:
+			return u"%s EMPTY" % gtype
+		return u"%s, %d vertices, %g %g - %g %g" % ((gtype, vertices) + bbox)
+
+	def _fetchSummaries(self, row):
+		""" read the geometries of up to geomBatch fetched rows around row,
+			as WKB, in a single query on their key, and keep their summary """
+		nfields = len(self.fields)
+		first = max(row - self.geomBatch // 2, self.fetchedFrom)
+		keys = []
+		for r in self.resdata[first - self.fetchedFrom:]:
+			if len(keys) >= self.geomBatch:
+				break
+			if r[nfields] not in self._summaries:
+				keys.append( r[nfields] )
 
-		self.connect(self.table, SIGNAL("aboutToChange"), self._deleteCursor)
-		self._createCursor()
+		geoms = [u"SDO_UTIL.TO_WKBGEOMETRY(%s)" % self.db.quoteId(self.table.fields()[col].name) for col in self._geomCols]
+		table_txt = self.db.quoteId( (self.table.schemaName(), self.table.name) )
+		params = {}
+		if self._scn is not None:
+			table_txt = u"%s AS OF SCN :scn" % table_txt
+			params['scn'] = self._scn
+		# always geomBatch keys: a single statement to parse
+		names = [u":k%d" % i for i in xrange(self.geomBatch)]
+		for i in xrange(self.geomBatch):
+			params['k%d' % i] = keys[i] if i < len(keys) else None
+		sql = u"SELECT %s, %s FROM %s WHERE %s IN (%s)" % (self._key, u", ".join(geoms), table_txt, self._key, u", ".join(names))
+
+		c = self.db._get_cursor()
+		c.outputtypehandler = self.db.nativeOutputTypeHandler
+		try:
+			self.db._execute_on(c, sql, params)
+			res = c.fetchall()
+		except DbError:
+			# e.g. geometries SDO_UTIL can't convert: show the placeholder
+			res = []
+		finally:
+			c.close()
+
+		for key in keys:
+			self._summaries[key] = None
+		for r in res:
+			self._summaries[r[0]] = [wkbSummary(wkb) if wkb is not None else None for wkb in r[1:]]
+		while len(self._summaries) > self.cachedSummaries:
+			self._summaries.popitem(last=False)
+
+	def _pagingKey(self):
+		""" the key of the rows: the primary key if it has a single column
+			(pages are sought on it), else the ROWID of tables. None for the
+			other views """
+		pk = [con.column for con in self.table.constraints() if con.type == TableConstraint.TypePrimaryKey]
+		if len(pk) == 1:
+			return self.db.quoteId(pk[0])
+		if not self.table.isView:
+			return u"ROWID"
+		return None
+
+	def _filterClause(self):
+		""" returns (where, params) of the data filter of the table (see
+			ORTable.setDataFilter): LIKE for character columns, equality
+			for the others, the value is bound; and of its spatial window
+			(see ORVectorTable.setSpatialWindow). (None, None) if unfiltered """
+		conditions = []
+		params = {}
+
+		if self.table.dataFilter is not None:
+			name, value = self.table.dataFilter
+			field = [fld for fld in self.table.fields() if fld.name == name]
+			if len(field) > 0:
+				op = u"LIKE" if field[0].dataType.lower().split("(")[0] in self.characterTypes else u"="
+				conditions.append( u"%s %s :filter" % (self.db.quoteId(name), op) )
+				params['filter'] = value
+
+		window = getattr(self.table, 'spatialWindow', None)
+		if window is not None:
+			condition, windowParams = self.db.spatialFilterSql(self.table.geomColumn, window, self.table.srid)
+			conditions.append( condition )
+			params.update( windowParams )
+
+		if len(conditions) == 0:
+			return None, None
+		return u" AND ".join(conditions), params
+
+	def _seeking(self):
+		""" pages are sought on the key (after the last key of a page read
+			before) when the rows aren't sorted on a column """
+		return self._key is not None and self._orderBy is None
 
-	def _createCursor(self):
+	def _sortable(self, field):
+		dataType = field.dataType.lower().split("(")[0]
+		return dataType in self.nativeTypes and dataType not in self.unsortableTypes
+
+	def _orderTerms(self):
+		""" the ORDER BY of the pages: a total order, so that each page
+			query gives the rows of its page only. Without a key (views),
+			every sortable column """
+		order = []
+		if self._orderBy is not None:
+			order.append( u"%s %s" % self._orderBy )
+		if self._key is not None:
+			order.append( self._key )
+		else:
+			for fld in self.table.fields():
+				name = self.db.quoteId(fld.name)
+				if self._sortable(fld) and (self._orderBy is None or name != self._orderBy[0]):
+					order.append( name )
+		return order
+
+	def _selectQuery(self):
+		""" returns (sql, params) of the rows, the key ending every row under
+			a name of its own, without paging """
 		fields_txt = u", ".join(self.fields)
 		table_txt = self.db.quoteId( (self.table.schemaName(), self.table.name) )
+		params = {}
+
+		if self._scn is not None:
+			table_txt = u"%s AS OF SCN :scn" % table_txt
+			params['scn'] = self._scn
+
+		sql = u"SELECT %s, %s AS \"__key\" FROM %s" % (fields_txt, self._key if self._key is not None else u"NULL", table_txt)
+		if self._where is not None:
+			sql = u"%s WHERE %s" % (sql, self._where)
+			params.update( self._whereParams )
+		return sql, params
+
+	def _pageQuery(self, page):
+		""" returns (sql, params) reading a page: seek after the last key of
+			the nearest page before it already read (see _seeking), then skip
+			the pages in between (OFFSET/FETCH from Oracle 12c, ROWNUM
+			before). Only the rows of the page are fetched """
+		sql, params = self._selectQuery()
+		skip = page
+
+		known = [p for p in self._pageKeys if p < page] if self._seeking() else []
+		if len(known) > 0:
+			last = max(known)
+			sql = u"%s %s %s > :last" % (sql, u"AND" if self._where is not None else u"WHERE", self._key)
+			params['last'] = self._pageKeys[last]
+			skip = page - last - 1
+		order = self._orderTerms()
+		if len(order) > 0:
+			sql = u"%s ORDER BY %s" % (sql, u", ".join(order))
+
+		if self._offsetFetch:
+			sql = u"%s OFFSET :lower ROWS FETCH NEXT :count ROWS ONLY" % sql
+			params.update({ 'lower': skip * self.pageSize, 'count': self.pageSize })
+		else:
+			sql = u"SELECT * FROM (SELECT a.*, ROWNUM As rnum FROM (%s) a WHERE ROWNUM <= :upper) WHERE rnum > :lower" % sql
+			params.update({ 'lower': skip * self.pageSize, 'upper': (skip + 1) * self.pageSize })
+
+		return sql, params
+
+	def _newCursor(self):
+		c = self.db._get_cursor()
+		c.arraysize = self.pageSize
+		if hasattr(c, 'prefetchrows'):
+			c.prefetchrows = self.pageSize + 1
+		c.outputtypehandler = self.db.nativeOutputTypeHandler
+		return c
+
+	def _readPage(self, page):
+		""" read a page (see _pageQuery), the cursor is closed at once """
+		sql, params = self._pageQuery(page)
+		c = self._newCursor()
+		try:
+			self.db._execute_on(c, sql, params)
+			rows = self._fetch(c, sql)
+		finally:
+			c.close()
+
+		if len(rows) > 0 and self._seeking():
+			self._pageKeys[page] = rows[-1][len(self.fields)]
+		return rows
+
+	def _fetch(self, c, sql):
+		try:
+			return c.fetchall()
+		except self.db.connection_error_types(), e:
+			raise ConnectionError(e)
+		except self.db.execution_error_types(), e:
+			raise DbError(e, sql)
+
+	def _keyLost(self, e):
+		""" the ROWID can't be read: join or aggregate views, external tables """
+		for code in ('ORA-01445', 'ORA-01446', 'ORA-30657'):
+			if code in e.msg:
+				return True
+		return False
+
+	def _cachePage(self, page, rows):
+		self._pages[page] = rows
+		while len(self._pages) > self.cachedPages:
+			self._pages.popitem(last=False)
+
+	def _page(self, page):
+		""" returns the rows of a page, from the cache if possible. The
+			key ends the rows (see _geometrySummary) """
+		rows = self._pages.pop(page, None)
+		if rows is None:
+			if self._takeSnapshot:
+				self._scn = self.db.getSystemChangeNumber()
+				self._takeSnapshot = False
+
+			try:
+				rows = self._readPage(page)
+			except DbError, e:
+				if self._scn is not None and self.db.snapshotTooOld(e):
+					# retry on the current data, and read it from now on
+					QgsMessageLog.logMessage(u"%s: the snapshot of the data is too old, the next rows are read as of now and are no longer consistent with those shown" % self.table.name, 'DBManager', QgsMessageLog.WARNING)
+					self._scn = None
+					self._resetPaging()
+					return self._page(page)
+				if self._key is None or not self._keyLost(e):
+					raise
+				self._key = None
+				self._resetPaging()
+				return self._page(page)
+
+		self._cachePage(page, rows)
+		return rows
+
+	def _resetPaging(self):
+		self._pages.clear()
+		self._pageKeys.clear()
+
+	def _clearPages(self):
+		self._cancelRowCount()
+		self._resetPaging()
+		self._summaries.clear()
+		self._lobValues.clear()
+		# the table is about to change: take a new snapshot with the next page
+		self._takeSnapshot = True
 
-		self.cursor = self.db._get_cursor()
-		sql = u"SELECT %s FROM %s" % (fields_txt, table_txt)
+	def sort(self, column, order=Qt.AscendingOrder):
+		""" sort the rows on a column, by the server. Columns which can't be
+			sorted (geometries, LOBs, objects) and column -1 give back the
+			initial order """
+		orderBy = None
+		fields = self.table.fields()
+		if 0 <= column < len(fields):
+			if self._sortable(fields[column]):
+				orderBy = (self.db.quoteId(fields[column].name), u"DESC" if order == Qt.DescendingOrder else u"ASC")
+		if orderBy == self._orderBy:
+			return
 
-		self.db._execute(self.cursor, sql)
+		self.emit(SIGNAL("layoutAboutToBeChanged()"))
+		self._orderBy = orderBy
+		self._resetPaging()
+		# read the rows again with the next getData
+		self.resdata = []
+		self.fetchedFrom = -self.fetchedCount - 1
+		self.emit(SIGNAL("layoutChanged()"))
+
+	# types fetched as they are (see OracleDBConnector.nativeOutputTypeHandler)
+	nativeTypes = ( "number", "float", "integer", "binary_float", "binary_double",
+			"varchar2", "nvarchar2", "char", "nchar", "long",
+			"date", "timestamp", "clob", "nclob", "blob", "raw" )
+	# filtered with LIKE, not sortable, read cut
+	characterTypes = ( "varchar2", "nvarchar2", "char", "nchar" )
+	unsortableTypes = ( "long", "clob", "nclob", "blob" )
+	lobTypes = ( "clob", "nclob", "blob", "xmltype" )
 
 	def _sanitizeTableField(self, field):
 		# get fields, ignore geometry columns
                 #TODO: return the geometry type of the table
 		if field.dataType.lower() == "sdo_geometry":
                         return u"CASE WHEN %(fld)s IS NULL THEN NULL ELSE 'GEOMETRY' END AS %(fld)s" % {'fld': self.db.quoteId(field.name)}
-                if field.dataType.lower() == "date":
-                        return u"CAST(%s AS VARCHAR2(8))" % self.db.quoteId(field.name)
+		# TIMESTAMP(n) as well, but not WITH TIME ZONE (unsupported by older cx_Oracle)
+		dataType = field.dataType.lower()
+		if dataType in self.lobTypes:
+			return u"%s AS %s" % (self.db.lobDisplaySql(field.name, dataType), self.db.quoteId(field.name))
+		if dataType.split("(")[0] in self.nativeTypes and not dataType.endswith(" with time zone"):
+			return self.db.quoteId(field.name)
 
 		return u"CAST(%s As VARCHAR2(%s))" % (self.db.quoteId(field.name), field.charMaxLen)
 
-	def _deleteCursor(self):
-		self.db._close_cursor(self.cursor)
-		self.cursor = None
-
 	def __del__(self):
-		self.disconnect(self.table, SIGNAL("aboutToChange"), self._deleteCursor)
-		self._deleteCursor()
+		self.disconnect(self.table, SIGNAL("aboutToChange"), self._clearPages)
+		self._clearPages()
 		pass	#print "PGTableModel.__del__"
 
 	def fetchMoreData(self, row_start):
-		if not self.cursor:
-			self._createCursor()
+		first = row_start // self.pageSize
+		last = (row_start + self.fetchedCount - 1) // self.pageSize
 
-		#try:
-		#	self.cursor.scroll(row_start, mode='absolute')
-		#except self.db.error_types():
-		#	self._deleteCursor()
-		#	return self.fetchMoreData(row_start)
+		rows = []
+		for page in range(first, last + 1):
+			rows.extend(self._page(page))
 
-		self.resdata = self.cursor.fetchmany(self.fetchedCount)
+		offset = row_start - first * self.pageSize
+		self.resdata = rows[offset:offset + self.fetchedCount]
 		self.fetchedFrom = row_start
 
 
 class ORSqlResultModel(SqlResultModel):
+	""" result of a SQL window statement. Rows are fetched by batches
+		(canFetchMore/fetchMore), as the view scrolls, up to sqlMaxRows.
+		secs() is the time to the first batch, fetchSecs() the time spent
+		fetching so far """
+
 	def __init__(self, db, sql, parent=None):
 		self.db = db.connector
+		# set before the statement runs: __del__ is called if it fails
+		self.resdata = None
+		self._cursor = None
+		self._session = None
+		# the session of the statement is the one of the model
+		self._owner = id(self)
+		self._truncated = False
+		self._fetchSecs = 0.0
 
 		t = QTime()
 		t.start()
-		c = self.db._execute(None, unicode(sql))
+		worker = self._execute(unicode(sql), parent)
 
 		self._affectedRows = 0
-		data = []
-		header = self.db._get_cursor_columns(c)
-		if header == None:
-			header = []
+		self._session = worker.session()
+		c = worker.cursor
+		header = worker.header
 
-		try:
-			if len(header) > 0:
-				data = self.db._fetchall(c)
+		BaseTableModel.__init__(self, header, [], parent)
+
+		if len(header) > 0:
+			# rows kept by columns, much more compact than tuples,
+			# beyond sqlSpillRows in a temporary file
+			spill = self.db.sqlSpillRows
+			if spill > 0 and (self.db.sqlMaxRows <= 0 or spill < self.db.sqlMaxRows):
+				self.resdata = ORSpillStore(len(header), self.db.sqlSpillRows)
+			else:
+				self.resdata = ORColumnStore(len(header))
+			self._cursor = c
+			self.resdata.extend( worker.rows )
 			self._affectedRows = c.rowcount
-		except DbError:
-			# nothing to fetch!
-			data = []
-			header = []
+			if self.db.sqlMaxRows > 0 and len(worker.rows) >= self.db.sqlMaxRows:
+				self._truncate()
+			elif len(worker.rows) < c.arraysize:
+				self._closeCursor()
+		else:
+			self._affectedRows = c.rowcount
+			# commit before closing the cursor to make sure that the changes are stored
+			try:
+				self._session.commit()
+			except self.db.execution_error_types(), e:
+				raise DbError(e, sql)
+			finally:
+				c.close()
+				self._releaseSession()
+		del c, worker
 
                 self._secs = t.elapsed() / 1000.0
+		self._fetchSecs = self._secs
+		if self._truncated:
+			self._logTruncated()
 		del t
 
-		BaseTableModel.__init__(self, header, data, parent)
+		# the granted privileges may have changed
+		if QRegExp(u"^\\s*(GRANT|REVOKE|SET\\s+ROLE)\\b", Qt.CaseInsensitive).indexIn(unicode(sql)) >= 0:
+			self.db.invalidatePrivilegesCache()
 
+	def _execute(self, sql, parent):
+		""" run the statement on a worker thread, showing a progress dialog
+			whose Cancel button interrupts it. Returns the finished worker """
+		db, owner = self.db, self._owner
+		worker = ORSqlExecuteThread(self.db, sql, owner)
+		loop = QEventLoop()
+		QObject.connect(worker, SIGNAL("finished()"), loop.quit)
+
+		progress = QProgressDialog(QApplication.translate("DBManagerPlugin", "Executing the query..."), QApplication.translate("DBManagerPlugin", "Cancel"),
+					   0, 0, parent if isinstance(parent, QWidget) else None)
+		progress.setWindowModality(Qt.WindowModal)
+		progress.setMinimumDuration(500)
+		QObject.connect(progress, SIGNAL("canceled()"), worker.cancel)
+
+		QApplication.setOverrideCursor(Qt.BusyCursor)
+		try:
+			worker.start()
+			loop.exec_()
+		finally:
+			QApplication.restoreOverrideCursor()
+			progress.close()
+
+		if worker.error is not None or worker.cursor is None:
+			db.releaseSqlSession(owner)
+		if worker.error is not None:
+			raise worker.error
+		if worker.cursor is None:
+			raise DbError(QApplication.translate("DBManagerPlugin", "Query cancelled"), sql)
+		return worker
+
+	def _fetchBatch(self):
+		""" fetch the next array of rows, close the cursor when it is
+			exhausted or when sqlMaxRows rows have been fetched """
+		count = self._cursor.arraysize
+		if self.db.sqlMaxRows > 0:
+			count = min(count, self.db.sqlMaxRows - len(self.resdata))
+
+		try:
+			# on the session of the statement, not the connector one
+			rows = self.db._fetchmany_on(self._cursor, count)
+		except (DbError, ConnectionError):
+			# nothing to fetch!
+			rows = []
+		self._affectedRows = self._cursor.rowcount
+
+		if len(rows) < count:
+			self._closeCursor()
+		elif self.db.sqlMaxRows > 0 and len(self.resdata) + len(rows) >= self.db.sqlMaxRows:
+			self._truncate()
+		return rows
+
+	def _truncate(self):
+		""" sqlMaxRows rows have been fetched: leave the next ones out """
+		self._truncated = True
+		self._closeCursor()
+
+	def _logTruncated(self):
+		QgsMessageLog.logMessage(u"SQL window: the result is cut after sqlMaxRows (%d) rows, fetched in %.3f s" % (self.db.sqlMaxRows, self.fetchSecs()), 'DBManager', QgsMessageLog.INFO)
+
+	def _closeCursor(self):
+		if self._cursor is None:
+			return
 		# commit before closing the cursor to make sure that the changes are stored
-		self.db._commit()
-		c.close()
-		del c
+		try:
+			self._session.commit()
+		except self.db.connection_error_types() + self.db.execution_error_types():
+			pass
+		self._cursor.close()
+		self._cursor = None
+		self._releaseSession()
+
+	def _releaseSession(self):
+		""" the statement is done: give the session of the window back """
+		if self._session is not None:
+			self.db.releaseSqlSession(self._owner)
+			self._session = None
+
+	def __del__(self):
+		self._closeCursor()
+		if isinstance(self.resdata, ORSpillStore):
+			self.resdata.close()
 
+	def getData(self, row, col):
+		return self.resdata.value(row, col)
+
+	def canFetchMore(self, parent=QModelIndex()):
+		return self._cursor is not None and not parent.isValid()
+
+	def fetchMore(self, parent=QModelIndex()):
+		if self._cursor is None or parent.isValid():
+			return
+
+		t = QTime()
+		t.start()
+		rows = self._fetchBatch()
+		self._fetchSecs += t.elapsed() / 1000.0
+		if self._truncated:
+			self._logTruncated()
 
+		if len(rows) > 0:
+			self.beginInsertRows(QModelIndex(), len(self.resdata), len(self.resdata) + len(rows) - 1)
+			self.resdata.extend(rows)
+			self.endInsertRows()
 
+	def fetchSecs(self):
+		return self._fetchSecs
 
+	def truncated(self):
+		""" whether the rows beyond sqlMaxRows have been left out """
+		return self._truncated
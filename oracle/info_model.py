@@ -40,6 +40,11 @@ class ORDatabaseInfo(DatabaseInfo):
                         (QApplication.translate("DBManagerPlugin", "SQLite list tables cache:"), "Enabled" if self.db.connector.hasCache else "Unavailable")
                 ]
 
+		# session pool usage
+		stats = self.db.connector.getPoolStatistics()
+		tbl.append( (QApplication.translate("DBManagerPlugin", "Session pool:"), QApplication.translate("DBManagerPlugin", "%(busy)d busy / %(opened)d open (min %(min)d, max %(max)d)") % stats) )
+		tbl.append( (QApplication.translate("DBManagerPlugin", "Session pool wait:"), QApplication.translate("DBManagerPlugin", "%(waitTime).3f s for %(acquired)d sessions (max %(maxWaitTime).3f s)") % stats) )
+
 		return HtmlTable( tbl )
 
 	def spatialInfo(self):
@@ -73,8 +78,11 @@ class ORTableInfo(TableInfo):
 	def generalInfo(self):
 		ret = []
 
-		# if the estimation is less than 100 rows, try to count them - it shouldn't take long time
-		if self.table.rowCount == None and self.table.estimatedRowCount < 100:
+		if self.table.estimatedRowCountSure == None:
+			self.table.refreshRowCountEstimate()
+
+		# if the table is sure to have less than 100 rows, try to count them - it shouldn't take long time
+		if self.table.rowCount == None and self.table.estimatedRowCountSure and self.table.estimatedRowCount < 100:
 			# row count information is not displayed yet, so just block
 			# table signals to avoid double refreshing (infoViewer->refreshRowCount->tableChanged->infoViewer)
 			self.table.blockSignals(True)
@@ -89,7 +97,7 @@ class ORTableInfo(TableInfo):
 			tbl.append( (QApplication.translate("DBManagerPlugin", "Comment:"), self.table.comment) )
 
 		tbl.extend([
-			(QApplication.translate("DBManagerPlugin", "Rows (estimation):"), self.table.estimatedRowCount )
+			(QApplication.translate("DBManagerPlugin", "Rows (estimation):"), self.table.estimatedRowCount if self.table.estimatedRowCountSure else QApplication.translate("DBManagerPlugin", "%d (no up-to-date statistics)") % self.table.estimatedRowCount )
 		])
 
 		# privileges
@@ -100,7 +108,8 @@ class ORTableInfo(TableInfo):
 		elif schema_priv[1] == False:	# no usage privileges on the schema
 			tbl.append( (QApplication.translate("DBManagerPlugin", "Privileges:"), QApplication.translate("DBManagerPlugin", "<warning> This user doesn't have usage privileges for this schema!") ) )
 		else:
-			table_priv = self.table.database().connector.getTablePrivileges( (self.table.schemaName(), self.table.name) )
+			description = self.table.description()
+			table_priv = description['privileges'] if description else self.table.database().connector.getTablePrivileges( (self.table.schemaName(), self.table.name) )
 			privileges = []
 			if table_priv[0]:
 				privileges.append("select")
@@ -297,7 +306,11 @@ class ORVectorTableInfo(ORTableInfo, VectorTableInfo):
 			tbl.append( (QApplication.translate("DBManagerPlugin", "Dimension:"), self.table.geomDim) )
 
 		srid = self.table.srid if self.table.srid != None else -1
-		sr_info = self.table.database().connector.getSpatialRefInfo(srid) if srid != -1 else QApplication.translate("DBManagerPlugin", "Undefined")
+		description = self.table.description() if srid != -1 else None
+		if description:
+			sr_info = description['srsName']
+		else:
+			sr_info = self.table.database().connector.getSpatialRefInfo(srid) if srid != -1 else QApplication.translate("DBManagerPlugin", "Undefined")
 		if sr_info:
 			tbl.append( (QApplication.translate("DBManagerPlugin", "Spatial ref:"), u"%s (%d)" % (sr_info, srid)) )
 
@@ -317,14 +330,24 @@ class ORVectorTableInfo(ORTableInfo, VectorTableInfo):
 		# extent
 		if self.table.extent != None and self.table.extent[0] != None:
 			extent_str = '%.5f, %.5f - %.5f, %.5f' % self.table.extent
+			if self.table.extentTier == 'sample':
+				extent_str += QApplication.translate("DBManagerPlugin", ' (sampled) (<a href="action:extent/full">compute it exactly</a>)')
+			elif self.table.extentTier in ('index', 'tune'):
+				extent_str += QApplication.translate("DBManagerPlugin", ' (from the spatial index) (<a href="action:extent/full">compute it exactly</a>)')
 		else:
 			extent_str = QApplication.translate("DBManagerPlugin", '(unknown) (<a href="action:extent/get">find out</a>)')
 		tbl.append( (QApplication.translate("DBManagerPlugin", "Extent:"), extent_str) )
 
+		# data grid restricted to the map window
+		if self.table.spatialWindow is not None:
+			window_str = '%.5f, %.5f - %.5f, %.5f' % self.table.spatialWindow
+			window_str += QApplication.translate("DBManagerPlugin", ' (<a href="action:window/off">show all the rows</a>)')
+			tbl.append( (QApplication.translate("DBManagerPlugin", "Data window:"), window_str) )
+
 		ret.append( HtmlTable( tbl ) )
 
                 # Handle extent update metadata
-                if self.table.extent != None and self.table.extent[0] != None and self.table.estimatedExtent != None and self.table.estimatedExtent[0] != None and self.table.extent != self.table.estimatedExtent:
+                if self.table.extent != None and self.table.extent[0] != None and self.table.extentTier != 'sample' and self.table.estimatedExtent != None and self.table.estimatedExtent[0] != None and self.table.extent != self.table.estimatedExtent:
                         ret.append( HtmlParagraph( QApplication.translate("DBManagerPlugin", '<warning> Metadata extent is different from real extent. You should <a href="action:extent/update">update it</a> !') ) )
 
 		# is there an entry in geometry_columns?
@@ -29,7 +29,7 @@ from .connector import OracleDBConnector
 from PyQt4.QtCore import *
 from PyQt4.QtGui import *
 
-from ..plugin import ConnectionError, InvalidDataException, DBPlugin, Database, Schema, Table, VectorTable, TableField, TableConstraint, TableIndex, TableTrigger, TableRule
+from ..plugin import ConnectionError, DbError, InvalidDataException, DBPlugin, Database, Schema, Table, VectorTable, TableField, TableConstraint, TableIndex, TableTrigger, TableRule
 
 try:
 	from . import resources_rc
@@ -99,6 +99,27 @@ class OracleDBPlugin(DBPlugin):
                 uri.setParam('geometryColumnsOnly', str(settings.value("geometryColumnsOnly", False, type=bool)))
                 uri.setParam('allowGeometrylessTables', str(settings.value("allowGeometrylessTables", False, type=bool)))
                 uri.setParam('onlyExistingTypes', str(settings.value("onlyExistingTypes", False, type=bool)))
+                uri.setParam('geomTypesBatchSize', str(settings.value("geomTypesBatchSize", 20, type=int)))
+                uri.setParam('geomTypesParallelism', str(settings.value("geomTypesParallelism", 1, type=int)))
+                uri.setParam('geomTypesSampleRows', str(settings.value("geomTypesSampleRows", 1000, type=int)))
+                uri.setParam('geomTypesSampleTimeout', str(settings.value("geomTypesSampleTimeout", 0, type=int)))
+                uri.setParam('geomTypesEscalate', str(settings.value("geomTypesEscalate", False, type=bool)))
+                uri.setParam('geomTypesCache', str(settings.value("geomTypesCache", True, type=bool)))
+                uri.setParam('extentTimeout', str(settings.value("extentTimeout", 0, type=int)))
+                uri.setParam('extentParallelism', str(settings.value("extentParallelism", 1, type=int)))
+                uri.setParam('fetchArraySize', str(settings.value("fetchArraySize", 0, type=int)))
+                uri.setParam('fetchBytes', str(settings.value("fetchBytes", 262144, type=int)))
+                uri.setParam('stmtCacheSize', str(settings.value("stmtCacheSize", 20, type=int)))
+                uri.setParam('sqlMaxRows', str(settings.value("sqlMaxRows", 1000000, type=int)))
+                uri.setParam('sqlTimeout', str(settings.value("sqlTimeout", 0, type=int)))
+                uri.setParam('sqlSpillRows', str(settings.value("sqlSpillRows", 100000, type=int)))
+                uri.setParam('lobDisplaySize', str(settings.value("lobDisplaySize", 1000, type=int)))
+                uri.setParam('sqlLayerTypesTtl', str(settings.value("sqlLayerTypesTtl", 3600, type=int)))
+                # session pool sizing
+                uri.setParam('poolMinSessions', str(settings.value("poolMinSessions", 1, type=int)))
+                uri.setParam('poolMaxSessions', str(settings.value("poolMaxSessions", 4, type=int)))
+                uri.setParam('poolIncrement', str(settings.value("poolIncrement", 1, type=int)))
+                uri.setParam('poolWaitTimeout', str(settings.value("poolWaitTimeout", 5000, type=int)))
                 
 		settings.endGroup()
 
@@ -167,34 +188,52 @@ class ORDatabase(Database):
 		from .data_model import ORSqlResultModel
 		return ORSqlResultModel(self, sql, parent)
 
-	def toSqlLayer(self, sql, geomCol, uniqueCol, layerName="QueryLayer", layerType=None, avoidSelectById=False):
-		from qgis.core import QgsMapLayer, QgsVectorLayer
+	def toSqlLayer(self, sql, geomCol, uniqueCol, layerName="QueryLayer", layerType=None, avoidSelectById=False, extent=None):
+		""" the query as a layer. With an extent (xmin, ymin, xmax, ymax in
+			the coordinates of the geometry column), only the features
+			within it, sought with the spatial index """
+		from qgis.core import QGis, QgsMapLayer, QgsVectorLayer
 		uri = self.uri()
 
-		uri.setDataSource("", u"(%s\n)" % sql, geomCol, "", uniqueCol)
+		# the geometry type and SRID are given to the provider, which
+		# doesn't have to detect them (and fail on mixed types): the layer
+		# is built once, the query sampled once for a while
+		wkbType, srid = QGis.WKBUnknown, None
+		if geomCol:
+			wkbType, srid = self.connector.getSqlLayerGeomType(sql, geomCol)
+
+		# the window has the SRID of the geometries, SDO_FILTER fails otherwise
+		layerSql = sql
+		if extent is not None and geomCol:
+			condition, params = self.connector.spatialFilterSql(geomCol, extent, srid, True)
+			layerSql = u"SELECT * FROM (%s\n) WHERE %s" % (sql, condition)
+
+		uri.setDataSource("", u"(%s\n)" % layerSql, geomCol, "", uniqueCol)
 		if avoidSelectById:
 			uri.disableSelectAtId( True )
 		provider = self.dbplugin().providerName()
-                vlayer = QgsVectorLayer(uri.uri(), layerName, provider)
-
-                # handling undetermined geometry type
-                if not vlayer.isValid():
-                        con = self.database().connector
-                        wkbType = con.getTableMainGeomType(u"(%s)" % sql, geomCol)
-                        uri.setWkbType(wkbType)
-                        vlayer = QgsVectorLayer(uri.uri(), layerName, provider)
-                        
+
+		if wkbType != QGis.WKBUnknown:
+			uri.setWkbType(wkbType)
+		if srid is not None:
+			uri.setSrid(str(srid))
+
+		vlayer = QgsVectorLayer(uri.uri(), layerName, provider)
 		return vlayer
 
 	def registerDatabaseActions(self, mainWindow):
 		action = QAction(QApplication.translate("DBManagerPlugin", "&Re-connect"), self)
 		mainWindow.registerAction( action, QApplication.translate("DBManagerPlugin", "&Database"), self.reconnectActionSlot )
+		action = QAction(QApplication.translate("DBManagerPlugin", "Clear geometry types &cache"), self)
+		mainWindow.registerAction( action, QApplication.translate("DBManagerPlugin", "&Database"), self.clearGeomTypesCacheActionSlot )
 
 		if self.schemas() != None:
 			action = QAction(QApplication.translate("DBManagerPlugin", "&Create schema"), self)
 			mainWindow.registerAction( action, QApplication.translate("DBManagerPlugin", "&Schema"), self.createSchemaActionSlot )
 			action = QAction(QApplication.translate("DBManagerPlugin", "&Delete (empty) schema"), self)
 			mainWindow.registerAction( action, QApplication.translate("DBManagerPlugin", "&Schema"), self.deleteSchemaActionSlot )
+			action = QAction(QApplication.translate("DBManagerPlugin", "&Update extent metadata"), self)
+			mainWindow.registerAction( action, QApplication.translate("DBManagerPlugin", "&Schema"), self.updateExtentsMetadataActionSlot )
 
 		action = QAction(QApplication.translate("DBManagerPlugin", "Delete selected item"), self)
 		mainWindow.registerAction( action, None, self.deleteActionSlot )
@@ -208,7 +247,130 @@ class ORDatabase(Database):
 		mainWindow.registerAction( action, QApplication.translate("DBManagerPlugin", "&Table"), self.deleteTableActionSlot )
 		action = QAction(QApplication.translate("DBManagerPlugin", "&Empty table"), self)
 		mainWindow.registerAction( action, QApplication.translate("DBManagerPlugin", "&Table"), self.emptyTableActionSlot )
+		action = QAction(QApplication.translate("DBManagerPlugin", "&Filter data"), self)
+		mainWindow.registerAction( action, QApplication.translate("DBManagerPlugin", "&Table"), self.filterTableDataActionSlot )
+		action = QAction(QApplication.translate("DBManagerPlugin", "Preview the &map window"), self)
+		mainWindow.registerAction( action, QApplication.translate("DBManagerPlugin", "&Table"), self.spatialWindowActionSlot )
+		action = QAction(QApplication.translate("DBManagerPlugin", "Show the full &value"), self)
+		mainWindow.registerAction( action, QApplication.translate("DBManagerPlugin", "&Table"), self.fullValueActionSlot )
+
+
+	def clearGeomTypesCacheActionSlot(self, item, action, parent):
+		""" forget the cached geometry types and list the tables again """
+		self.connector.clearGeomTypesCache()
+		self.refresh()
+
+	def filterTableDataActionSlot(self, item, action, parent):
+		""" ask a column and a value to filter the data grid of a table on """
+		QApplication.restoreOverrideCursor()
+		try:
+			if not isinstance(item, ORTable):
+				QMessageBox.information(parent, QApplication.translate("DBManagerPlugin", "Sorry"), QApplication.translate("DBManagerPlugin", "Select a TABLE to filter its data."))
+				return
+
+			noFilter = QApplication.translate("DBManagerPlugin", "(all the rows)")
+			names = [noFilter] + [fld.name for fld in item.fields() if fld.dataType.lower() != "sdo_geometry"]
+			current = names.index(item.dataFilter[0]) if item.dataFilter is not None and item.dataFilter[0] in names else 0
+			name, ok = QInputDialog.getItem(parent, QApplication.translate("DBManagerPlugin", "Filter data"), QApplication.translate("DBManagerPlugin", "Column:"), names, current, False)
+			if not ok:
+				return
+			if name == noFilter:
+				item.setDataFilter(None, None)
+				return
+
+			value, ok = QInputDialog.getText(parent, QApplication.translate("DBManagerPlugin", "Filter data"),
+							 QApplication.translate("DBManagerPlugin", "Value (% and _ are wildcards for text columns):"),
+							 QLineEdit.Normal, item.dataFilter[1] if item.dataFilter is not None else u"")
+			if not ok:
+				return
+			item.setDataFilter(unicode(name), unicode(value))
+		finally:
+			QApplication.setOverrideCursor(Qt.WaitCursor)
+
+	def fullValueActionSlot(self, item, action, parent):
+		""" show the whole value of the current cell of the data grid, LOB
+			values being cut in the grid (see ORTableDataModel.fullValue) """
+		from .data_model import ORTableDataModel
+		viewer = getattr(parent, 'table', None)
+		model = viewer.model() if viewer is not None else None
+		index = viewer.currentIndex() if viewer is not None else QModelIndex()
+		if not isinstance(model, ORTableDataModel) or not index.isValid():
+			QApplication.restoreOverrideCursor()
+			try:
+				QMessageBox.information(parent, QApplication.translate("DBManagerPlugin", "Sorry"), QApplication.translate("DBManagerPlugin", "Select a cell in the table data to show its full value."))
+			finally:
+				QApplication.setOverrideCursor(Qt.WaitCursor)
+			return
+
+		val = model.fullValue(index.row(), index.column())
+		if isinstance(val, buffer):
+			val = str(val).encode('hex').upper()
+		elif val is not None and not isinstance(val, basestring):
+			val = model.data(index, Qt.DisplayRole)
+
+		QApplication.restoreOverrideCursor()
+		try:
+			dlg = QDialog(parent)
+			dlg.setWindowTitle( model.headerData(index.column(), Qt.Horizontal, Qt.DisplayRole) )
+			layout = QVBoxLayout(dlg)
+			text = QPlainTextEdit(dlg)
+			text.setReadOnly(True)
+			text.setPlainText(u"NULL" if val is None else val)
+			layout.addWidget(text)
+			buttons = QDialogButtonBox(QDialogButtonBox.Close, Qt.Horizontal, dlg)
+			QObject.connect(buttons, SIGNAL("rejected()"), dlg.reject)
+			layout.addWidget(buttons)
+			dlg.resize(600, 400)
+			dlg.exec_()
+		finally:
+			QApplication.setOverrideCursor(Qt.WaitCursor)
+
+	def spatialWindowActionSlot(self, item, action, parent):
+		""" show only the rows of a vector table within the map canvas
+			extent (and follow it), or all of them again """
+		QApplication.restoreOverrideCursor()
+		try:
+			if not isinstance(item, ORVectorTable):
+				QMessageBox.information(parent, QApplication.translate("DBManagerPlugin", "Sorry"), QApplication.translate("DBManagerPlugin", "Select a VECTOR TABLE to preview the map window of."))
+				return
+		finally:
+			QApplication.setOverrideCursor(Qt.WaitCursor)
 
+		item.followMapCanvas(item.spatialWindow is None)
+
+	def updateExtentsMetadataActionSlot(self, item, action, parent):
+		""" update the extent metadata of all the vector tables of a schema """
+		QApplication.restoreOverrideCursor()
+		try:
+			if isinstance(item, Table):
+				item = item.schema()
+			if not isinstance(item, Schema):
+				QMessageBox.information(parent, QApplication.translate("DBManagerPlugin", "Sorry"), QApplication.translate("DBManagerPlugin", "Select a SCHEMA to update the extent metadata of its tables."))
+				return
+		finally:
+			QApplication.setOverrideCursor(Qt.WaitCursor)
+
+		t = QTime()
+		t.start()
+		report = item.updateExtentsMetadata()
+		elapsed = t.elapsed() / 1000.0
+
+		details = []
+		for tablename, geom, extent, tier, secs in report:
+			if extent is None:
+				details.append( u"%s.%s: %s (%.2f s)" % (tablename, geom, QApplication.translate("DBManagerPlugin", "no extent"), secs) )
+			else:
+				details.append( u"%s.%s: %s (%.2f s)" % (tablename, geom, tier, secs) )
+
+		QApplication.restoreOverrideCursor()
+		try:
+			box = QMessageBox(QMessageBox.Information, QApplication.translate("DBManagerPlugin", "Update extent metadata"),
+					  QApplication.translate("DBManagerPlugin", "%d of %d geometry columns updated in %.2f s.") % (len([r for r in report if r[2] is not None]), len(report), elapsed),
+					  QMessageBox.Ok, parent)
+			box.setDetailedText( u"\n".join(details) )
+			box.exec_()
+		finally:
+			QApplication.setOverrideCursor(Qt.WaitCursor)
 
 	def schemas(self):
                 """ make a sort of cache for schema listing to improve performances """
@@ -225,6 +387,13 @@ class ORSchema(Schema):
 		#self.oid, self.name, self.owner, self.perms, self.comment = row
                 self.name = row[0]
 
+	def updateExtentsMetadata(self):
+		""" update the extent metadata of all the vector tables of the schema,
+			returns the report of OracleDBConnector.updateExtentsMetadata """
+		report = self.database().connector.updateExtentsMetadata(self.name)
+		self.refresh()
+		return report
+
 
 class ORTable(Table):
 	def __init__(self, row, db, schema=None):
@@ -237,6 +406,73 @@ class ORTable(Table):
                 if not self.estimatedRowCount:
                         self.estimatedRowCount = 0
 		self.estimatedRowCount = int(self.estimatedRowCount)
+		self.estimatedRowCountSure = None
+		self._description = None
+		# (column name, value) the data grid is filtered on
+		self.dataFilter = None
+
+	def description(self):
+		""" dictionary snapshot of the table (see OracleDBConnector.describeTable),
+			fetched in a single round trip. Fills the fields, constraints,
+			indexes and triggers not loaded yet. Returns None on error """
+		if self._description is None:
+			geomCol = self.geomColumn if self.type == Table.VectorType else None
+			srid = self.srid if self.type == Table.VectorType else None
+			try:
+				self._description = self.database().connector.describeTable( (self.schemaName(), self.name), geomCol, srid )
+			except DbError:
+				return None
+
+			# constraints first: fields look up their primary key in them
+			if self._constraints is None:
+				self._constraints = map(lambda x: self.tableConstraintsFactory(x, self), self._description['constraints'])
+			if self._indexes is None:
+				self._indexes = map(lambda x: self.tableIndexesFactory(x, self), self._description['indexes'])
+			if self._triggers is None:
+				self._triggers = map(lambda x: self.tableTriggersFactory(x, self), self._description['triggers'])
+			if self._fields is None:
+				self._fields = map(lambda x: self.tableFieldsFactory(x, self), self._description['fields'])
+			if self.type == Table.VectorType and not self.isView and self.estimatedExtent is None:
+				self.estimatedExtent = self._description['estimatedExtent']
+
+		return self._description
+
+	def _prefetch(self, items):
+		""" a reload of the items also reloads the rest of the snapshot """
+		if items is None:
+			self._description = None
+			self.description()
+
+	def fields(self):
+		self._prefetch(self._fields)
+		return Table.fields(self)
+
+	def constraints(self):
+		self._prefetch(self._constraints)
+		return Table.constraints(self)
+
+	def indexes(self):
+		self._prefetch(self._indexes)
+		return Table.indexes(self)
+
+	def triggers(self):
+		self._prefetch(self._triggers)
+		return Table.triggers(self)
+
+	def setDataFilter(self, name, value):
+		""" filter the rows of the data grid on a column (LIKE for character
+			columns, = for the others), None to show all the rows """
+		self.dataFilter = (name, value) if name is not None else None
+		# reload the data grid
+		self.emit(SIGNAL("aboutToChange"))
+		self.emit(SIGNAL("changed"))
+
+	def refreshRowCountEstimate(self):
+		""" estimate the number of rows (see OracleDBConnector.estimateTableRowCount) """
+		connector = self.database().connector
+		rows, self.estimatedRowCountSure = connector.estimateTableRowCount( (self.schemaName(), self.name), connector.useEstimatedMetadata )
+		if rows is not None:
+			self.estimatedRowCount = int(rows)
 
 	def runAction(self, action):
 		action = unicode(action)
@@ -289,21 +525,117 @@ class ORVectorTable(ORTable, VectorTable):
 		ORTable.__init__(self, row[:-5], db, schema)
 		VectorTable.__init__(self, db, schema)
 		self.geomColumn, self.geomType, self.wkbType, self.geomDim, self.srid = row[-5:]
+		self.extentTier = None
+		# (xmin, ymin, xmax, ymax) the data grid is restricted to
+		self.spatialWindow = None
+		self._canvasTimer = None
+		self._crs = None
+
+	def setSpatialWindow(self, extent):
+		""" restrict the data grid to the rows within an extent, in the
+			coordinates of the geometry column (None: all the rows) """
+		self.spatialWindow = tuple(extent) if extent is not None else None
+		# reload the data grid
+		self.emit(SIGNAL("aboutToChange"))
+		self.emit(SIGNAL("changed"))
+
+	def followMapCanvas(self, follow=True):
+		""" restrict the data grid to the map canvas extent, again each time
+			it changes (after a pause, not at every step of a pan) """
+		from qgis.utils import iface
+		canvas = iface.mapCanvas()
+		if follow:
+			if self.srid and self.columnCrs() is None:
+				QMessageBox.warning(None, QApplication.translate("DBManagerPlugin", "Preview the map window"),
+						    QApplication.translate("DBManagerPlugin", "The coordinate system of SRID %d is unknown to QGis: the map extent can't be converted to it.") % self.srid)
+				return
+			if self._canvasTimer is None:
+				self._canvasTimer = QTimer(self)
+				self._canvasTimer.setSingleShot(True)
+				self._canvasTimer.setInterval(500)
+				self.connect(self._canvasTimer, SIGNAL("timeout()"), self._canvasExtentChanged)
+				self.connect(canvas, SIGNAL("extentsChanged()"), self._canvasTimer.start)
+			self._canvasExtentChanged()
+		else:
+			if self._canvasTimer is not None:
+				self.disconnect(canvas, SIGNAL("extentsChanged()"), self._canvasTimer.start)
+				self._canvasTimer.stop()
+				self._canvasTimer = None
+			self.setSpatialWindow(None)
+
+	def columnCrs(self):
+		""" the QGis CRS of the SRID of the geometry column: from its EPSG
+			code (given by Oracle for its own SRIDs, e.g. 8307), else from its
+			WKT. None if unknown """
+		from qgis.core import QgsCoordinateReferenceSystem
+		if self._crs is None and self.srid:
+			connector = self.database().connector
+			crs = QgsCoordinateReferenceSystem()
+			epsg = connector.getSridEpsg(self.srid)
+			if epsg is not None:
+				crs.createFromOgcWmsCrs(u"EPSG:%d" % epsg)
+			if not crs.isValid():
+				wkt = connector.getSridWkt(self.srid)
+				if wkt:
+					crs.createFromWkt(wkt)
+			if crs.isValid():
+				self._crs = crs
+		return self._crs
+
+	def _canvasExtentChanged(self):
+		from qgis.core import QgsCoordinateTransform
+		from qgis.utils import iface
+		canvas = iface.mapCanvas()
+		extent = canvas.extent()
+
+		# without SRID the geometries are in the coordinates of the map
+		crs = self.columnCrs()
+		canvasCrs = canvas.mapRenderer().destinationCrs()
+		if crs is not None and crs != canvasCrs:
+			extent = QgsCoordinateTransform(canvasCrs, crs).transformBoundingBox(extent)
+
+		self.setSpatialWindow( (extent.xMinimum(), extent.yMinimum(), extent.xMaximum(), extent.yMaximum()) )
 
 	def info(self):
 		from .info_model import ORVectorTableInfo
 		return ORVectorTableInfo(self)
 
+	def toMapLayer(self):
+		""" the layer of the table, restricted to the spatial window if any
+			(its preview follows the map window as the data grid does) """
+		if self.spatialWindow is None:
+			return VectorTable.toMapLayer(self)
+
+		uniqueCol = self.getValidQGisUniqueFields(True)
+		sql = u"SELECT * FROM %s" % self.database().connector.quoteId( (self.schemaName(), self.name) )
+		return self.database().toSqlLayer(sql, self.geomColumn, uniqueCol.name if uniqueCol else "", self.name, extent=self.spatialWindow)
+
 	def runAction(self, action):
+		if action.startswith( "window/" ):
+			if action == "window/off":
+				self.followMapCanvas(False)
+				return True
+
 		if action.startswith( "extent/" ):
 			if action == "extent/update":
                                 self.updateExtent()
 				return True
+			if action == "extent/full":
+				# explicit request: no time budget
+				self.refreshTableExtent(['full'], 0)
+				return True
 
 		if ORTable.runAction(self, action):
 			return True
 		return VectorTable.runAction(self, action)
 
+	def refreshTableExtent(self, tiers=None, budget=None):
+		""" find out the extent and the tier which produced it """
+		prevExtent = self.extent
+		self.extent, self.extentTier = self.database().connector.getTableExtentTier( (self.schemaName(), self.name), self.geomColumn, budget, tiers )
+		if self.extent != prevExtent:
+			self.refresh()
+
         def updateExtent(self):
 		self.database().connector.updateExtentMetadata( (self.schemaName(), self.name), self.geomColumn )
                 self.refreshTableEstimatedExtent()